@@ -0,0 +1,180 @@
+"""单文件压缩快照：以流的方式写入 tar + 压缩，恢复时直接流式解压到目标目录"""
+import os
+import gzip
+import ntpath
+import lzma
+import tarfile
+import contextlib
+
+import store
+
+
+# 编码 -> (扩展名, 默认压缩级别)，默认级别偏向速度
+CODECS = {
+    'zstd': ('.tar.zst', 3),
+    'gz': ('.tar.gz', 1),
+    'xz': ('.tar.xz', 1),
+}
+
+
+def _zstandard():
+    """zstandard 是可选依赖，第一次用到 zstd 时才导入，不拖慢热键程序启动；没有安装时返回 None，退回到标准库的 gzip/xz"""
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_codecs():
+    return [codec for codec in CODECS if codec != 'zstd' or _zstandard() is not None]
+
+
+def resolve_codec(codec):
+    """auto 时优先使用 zstd；指定了 zstd 但没有安装时退回到 gz"""
+    codec = (codec or 'auto').lower()
+    if codec == 'auto':
+        return 'zstd' if _zstandard() is not None else 'gz'
+    if codec not in CODECS:
+        raise ValueError(f"Unknown archive codec: {codec}. Available: {', '.join(CODECS)}")
+    if codec == 'zstd' and _zstandard() is None:
+        print("Warning: zstandard is not installed, falling back to gz.")
+        return 'gz'
+    return codec
+
+
+def is_archive(path):
+    return any(str(path).endswith(ext) for ext, _ in CODECS.values())
+
+
+def archive_codec(path):
+    for codec, (ext, _) in CODECS.items():
+        if str(path).endswith(ext):
+            return codec
+    raise ValueError(f"Not a snapshot archive: {path}")
+
+
+def archive_name(path):
+    """从压缩快照路径取出快照名，例如 save00_20240101_120000"""
+    ext = CODECS[archive_codec(path)][0]
+    return os.path.basename(str(path))[:-len(ext)]
+
+
+def _open_compressed_writer(raw, codec, level):
+    if codec == 'zstd':
+        return _zstandard().ZstdCompressor(level=level).stream_writer(raw, closefd=False)
+    if codec == 'gz':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=level)
+    return lzma.LZMAFile(raw, 'wb', preset=level)
+
+
+def open_compressed_reader(raw, codec):
+    if codec == 'zstd':
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to restore .tar.zst snapshots")
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+    if codec == 'gz':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    return lzma.LZMAFile(raw, 'rb')
+
+
+def is_unsafe_member_name(name):
+    """绝对路径、带盘符或 UNC 前缀（C:x、//server/share）以及含 .. 的成员名；反斜杠在 Windows 上也是分隔符，按 / 处理"""
+    normalized = name.replace('\\', '/')
+    return normalized.startswith('/') or bool(ntpath.splitdrive(name)[0]) or '..' in normalized.split('/')
+
+
+def member_path(dst, name):
+    """成员在 dst 中的目标路径；解析后不在 dst 之下时抛出 ValueError"""
+    target = os.path.join(dst, *name.split('/'))
+    root = os.path.realpath(dst)
+    if os.path.commonpath([root, os.path.realpath(target)]) != root:
+        raise ValueError(f"Archive member {name} would be written outside {dst}")
+    return target
+
+
+class _CheckedTarFile(tarfile.TarFile):
+    """逐个读取成员时检查路径，不安全的成员直接报错，写到目标目录之外之前就停下"""
+
+    def next(self):
+        member = super().next()
+        if member is not None and is_unsafe_member_name(member.name):
+            raise ValueError(f"Unsafe path in archive {self.name}: {member.name}")
+        return member
+
+
+@contextlib.contextmanager
+def open_tar(path):
+    """以流的方式打开压缩快照，返回只能顺序遍历的 TarFile，遍历到不安全的成员路径时抛出 ValueError"""
+    with open(path, 'rb') as raw:
+        with open_compressed_reader(raw, archive_codec(path)) as compressed:
+            with _CheckedTarFile.open(name=path, fileobj=compressed, mode='r|') as tar:
+                yield tar
+
+
+class _HashingReader:
+    """在 tarfile 读取源文件的同时计算摘要，避免为了索引再读一遍"""
+
+    def __init__(self, f):
+        self._f = f
+        self.hasher = store.new_hasher()
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def write_archive(src, dst_dir, name, codec='auto', level=None):
+    """把 src 流式写成一个压缩快照文件，返回 (快照路径, 文件索引)"""
+    codec = resolve_codec(codec)
+    ext, default_level = CODECS[codec]
+    level = default_level if level is None else int(level)
+    dst = os.path.join(dst_dir, name + ext)
+    if os.path.exists(dst):
+        raise FileExistsError(dst)
+
+    files = {}
+    # 先写以 . 开头的临时文件，写完再改名，中途失败不会留下残缺的快照
+    partial_dst = os.path.join(dst_dir, f'.partial_{name}{ext}')
+    try:
+        with open(partial_dst, 'wb') as raw:
+            with _open_compressed_writer(raw, codec, level) as compressed:
+                with tarfile.open(fileobj=compressed, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                    for root, dirnames, filenames in os.walk(src):
+                        for dirname in dirnames:
+                            dir_path = os.path.join(root, dirname)
+                            tar.add(dir_path, arcname=store.relpath_key(dir_path, src), recursive=False)
+                        for file_name in filenames:
+                            file_path = os.path.join(root, file_name)
+                            rel_file = store.relpath_key(file_path, src)
+                            # 在读取之前记录 mtime，读取期间被改写的文件在之后的一致性检查中才能被发现
+                            st = os.stat(file_path)
+                            tarinfo = tar.gettarinfo(file_path, arcname=rel_file)
+                            with open(file_path, 'rb') as f:
+                                reader = _HashingReader(f)
+                                tar.addfile(tarinfo, reader)
+                            files[rel_file] = {
+                                'size': tarinfo.size,
+                                'mtime_ns': st.st_mtime_ns,
+                                'hash': reader.hasher.hexdigest(),
+                            }
+        os.replace(partial_dst, dst)
+    except BaseException:
+        if os.path.exists(partial_dst):
+            os.remove(partial_dst)
+        raise
+    return dst, files
+
+
+def extract_archive(archive_path, dst, on_file=None):
+    """把压缩快照流式解压到 dst，不在内存或临时目录中整体暂存，on_file 在每个文件写完后调用"""
+    # open_tar 已经拒绝绝对路径和 ..，新版 Python 的 data 过滤器还会拒绝链接等不安全的成员
+    extract_kwargs = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+    os.makedirs(dst, exist_ok=True)
+    with open_tar(archive_path) as tar:
+        for member in tar:
+            tar.extract(member, dst, **extract_kwargs)
+            if member.isfile() and on_file is not None:
+                on_file(member)
@@ -0,0 +1,307 @@
+"""备份副本的存储后端：另一块磁盘上的目录（镜像）或 S3 兼容的对象存储
+
+每个后端按键（备份目录下文件的相对路径，分隔符为 '/'）存取文件，只需实现 list_keys、put_file、get_file 三个方法。
+快照总是先写在本地备份目录中，之后再由 replicate.Replicator 在后台同步到这些后端。
+
+S3 后端只用标准库实现：AWS Signature V4 签名、路径风格的地址（endpoint/bucket/key），
+空闲的 HTTP 连接放回连接池供之后的请求复用（不论来自哪个线程、哪一次同步），大文件分块并发上传（multipart upload）。
+"""
+import os
+import hmac
+import socket
+import hashlib
+import threading
+import http.client
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+import copyengine
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+# 对象的修改时间保存在自定义元数据中，取回时恢复，文件夹快照的差异恢复依赖它
+MTIME_HEADER = 'x-amz-meta-mtime-ns'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+class BackendError(Exception):
+    """后端请求失败，例如 S3 返回了错误状态码"""
+
+
+class Backend:
+    """存储后端的接口"""
+
+    name = None
+
+    def list_keys(self):
+        """返回后端中全部文件 {键: 字节数}"""
+        raise NotImplementedError
+
+    def put_file(self, key, path):
+        """上传本地文件 path，保留修改时间"""
+        raise NotImplementedError
+
+    def get_file(self, key, path):
+        """把文件下载到本地 path，先写临时文件再替换"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalBackend(Backend):
+    """另一个本地目录，通常在另一块磁盘或网络共享上"""
+
+    def __init__(self, root):
+        self.root = os.path.expandvars(root)
+        self.name = self.root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def list_keys(self):
+        keys = {}
+        for root, _, filenames in os.walk(self.root):
+            for file_name in filenames:
+                if file_name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, file_name)
+                keys[os.path.relpath(path, self.root).replace(os.sep, '/')] = os.path.getsize(path)
+        return keys
+
+    def _copy(self, src, dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp_path = f"{dst}.{threading.get_ident()}.tmp"
+        copyengine.fast_copy(src, tmp_path)
+        os.replace(tmp_path, dst)
+
+    def put_file(self, key, path):
+        self._copy(path, self._path(key))
+
+    def get_file(self, key, path):
+        self._copy(self._path(key), path)
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+
+def _strip_namespace(element):
+    for node in element.iter():
+        if '}' in node.tag:
+            node.tag = node.tag.split('}', 1)[1]
+    return element
+
+
+class S3Backend(Backend):
+    """S3 兼容的对象存储（AWS S3、MinIO 等）"""
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, prefix='', region='us-east-1',
+                 part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+        url = urlsplit(endpoint)
+        if url.scheme not in ('http', 'https') or not url.netloc:
+            raise ValueError(f"Invalid S3 endpoint: {endpoint}")
+        self.secure = url.scheme == 'https'
+        self.host = url.netloc
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.part_size = max(5 * 1024 * 1024, int(part_size))
+        self.workers = workers
+        self.name = f"s3://{bucket}/{self.prefix}" if self.prefix else f"s3://{bucket}"
+        # 空闲的长连接，避免每个文件重新握手；同步和分块上传的线程池每次都是新线程，连接不能绑定在线程上，
+        # 否则每次同步都会留下一批再也用不到的连接
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def _acquire(self):
+        """取一个空闲连接，没有时新建；服务器要求关闭的连接（sock 为 None）直接丢弃"""
+        with self._idle_lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if conn.sock is not None:
+                    return conn
+        conn_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        conn = conn_class(self.host, timeout=60)
+        conn.connect()
+        # 请求头和文件内容分两次发送，关闭 Nagle 算法以免每个小文件都等待一次延迟确认
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _release(self, conn):
+        with self._idle_lock:
+            self._idle.append(conn)
+
+    def close(self):
+        """关闭全部空闲连接"""
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _object_path(self, key):
+        full_key = f"{self.prefix}/{key}" if self.prefix else key
+        return f"/{self.bucket}/{full_key}"
+
+    def _sign(self, method, path, query, headers, payload_hash):
+        """按 AWS Signature V4 计算 Authorization 头"""
+        amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        date = amz_date[:8]
+        headers['host'] = self.host
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = payload_hash
+        canonical_query = '&'.join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}"
+                                   for k, v in sorted(query.items()))
+        signed_headers = sorted(headers)
+        canonical_headers = ''.join(f"{name}:{str(headers[name]).strip()}\n" for name in signed_headers)
+        canonical_request = '\n'.join([method, quote(path, safe='/-_.~'), canonical_query, canonical_headers,
+                                       ';'.join(signed_headers), payload_hash])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+        signing_key = _hmac(_hmac(_hmac(_hmac(('AWS4' + self.secret_key).encode('utf-8'), date),
+                                        self.region), 's3'), 'aws4_request')
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['authorization'] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(signed_headers)}, Signature={signature}")
+
+    def _request(self, method, path, query=None, body=None, headers=None, expect=(200,), stream_to=None):
+        """发送一次请求，返回 (响应头, 响应内容)；stream_to 不为 None 时把内容写入这个文件对象。
+
+        服务器关闭了复用的连接时重新连接并重试一次
+        """
+        query = query or {}
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        payload_hash = EMPTY_SHA256 if body is None else UNSIGNED_PAYLOAD
+        if isinstance(body, (bytes, bytearray)):
+            headers['content-length'] = str(len(body))
+        self._sign(method, path, query, headers, payload_hash)
+        url = quote(path, safe='/-_.~')
+        if query:
+            url += '?' + '&'.join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in query.items())
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                if stream_to is not None and response.status in expect:
+                    for chunk in iter(lambda: response.read(1024 * 1024), b''):
+                        stream_to.write(chunk)
+                    data = b''
+                else:
+                    data = response.read()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError,
+                    BrokenPipeError):
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+            except BaseException:
+                # 响应没有读完的连接不能再复用
+                conn.close()
+                raise
+            self._release(conn)
+            break
+        if response.status not in expect:
+            raise BackendError(f"{method} {path} failed with HTTP {response.status}: "
+                               f"{data.decode('utf-8', 'replace')[:200]}")
+        return response.headers, data
+
+    def list_keys(self):
+        keys = {}
+        query = {'list-type': '2'}
+        if self.prefix:
+            query['prefix'] = self.prefix + '/'
+        while True:
+            _, data = self._request('GET', f"/{self.bucket}", query)
+            root = _strip_namespace(ElementTree.fromstring(data))
+            for contents in root.findall('Contents'):
+                key = contents.findtext('Key')
+                if self.prefix:
+                    key = key[len(self.prefix) + 1:]
+                keys[key] = int(contents.findtext('Size'))
+            if root.findtext('IsTruncated') != 'true':
+                return keys
+            query['continuation-token'] = root.findtext('NextContinuationToken')
+
+    def put_file(self, key, path):
+        st = os.stat(path)
+        headers = {MTIME_HEADER: str(st.st_mtime_ns)}
+        if st.st_size <= self.part_size:
+            with open(path, 'rb') as f:
+                headers['content-length'] = str(st.st_size)
+                self._request('PUT', self._object_path(key), body=f, headers=headers)
+            return
+        self._put_multipart(key, path, st.st_size, headers)
+
+    def _put_multipart(self, key, path, size, headers):
+        """大文件按 part_size 分块，由线程池并发上传，任何一块失败都会中止整个上传"""
+        object_path = self._object_path(key)
+        _, data = self._request('POST', object_path, {'uploads': ''}, headers=headers)
+        upload_id = _strip_namespace(ElementTree.fromstring(data)).findtext('UploadId')
+
+        def upload_part(number):
+            offset = (number - 1) * self.part_size
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read(self.part_size)
+            response_headers, _ = self._request('PUT', object_path,
+                                                {'partNumber': str(number), 'uploadId': upload_id}, body=chunk)
+            return number, response_headers['ETag']
+
+        part_count = (size + self.part_size - 1) // self.part_size
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                parts = sorted(executor.map(upload_part, range(1, part_count + 1)))
+            body = ('<CompleteMultipartUpload>' + ''.join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>" for number, etag in parts)
+                + '</CompleteMultipartUpload>').encode('utf-8')
+            self._request('POST', object_path, {'uploadId': upload_id}, body=body)
+        except BaseException:
+            try:
+                self._request('DELETE', object_path, {'uploadId': upload_id}, expect=(200, 204))
+            except (OSError, BackendError):
+                pass
+            raise
+
+    def get_file(self, key, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                headers, _ = self._request('GET', self._object_path(key), stream_to=f)
+            mtime_ns = headers.get(MTIME_HEADER)
+            if mtime_ns is not None:
+                os.utime(tmp_path, ns=(int(mtime_ns), int(mtime_ns)))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def make_backend(config):
+    """按配置创建后端，例如 {"type": "mirror", "path": "E:\\\\NoitaBackup"} 或
+    {"type": "s3", "endpoint": "https://...", "bucket": "...", "access_key": "...", "secret_key": "..."}"""
+    kind = (config.get('type') or '').lower()
+    if kind in ('local', 'mirror'):
+        if not config.get('path'):
+            raise ValueError("A mirror backend needs a path.")
+        return LocalBackend(config['path'])
+    if kind == 's3':
+        missing = [key for key in ('endpoint', 'bucket', 'access_key', 'secret_key') if not config.get(key)]
+        if missing:
+            raise ValueError(f"S3 backend is missing {', '.join(missing)}.")
+        return S3Backend(config['endpoint'], config['bucket'],
+                         os.path.expandvars(config['access_key']), os.path.expandvars(config['secret_key']),
+                         prefix=config.get('prefix', ''), region=config.get('region', 'us-east-1'),
+                         part_size=config.get('part_size', DEFAULT_PART_SIZE),
+                         workers=config.get('workers', DEFAULT_WORKERS))
+    raise ValueError(f"Unknown backend type: {config.get('type')!r}. Available: mirror, s3")
@@ -0,0 +1,52 @@
+"""对比各压缩编码的快照大小与耗时，以 shutil.copytree 为基准
+
+用法: python benchmarks/bench_archive.py [文件数]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import archive
+from bench_copy import make_tree
+
+
+def tree_size(root):
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(root) for f in files)
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'save00')
+        make_tree(src, file_count, compressible=True)
+        raw_size = tree_size(src)
+        print(f"Synthetic tree: {file_count} files, {raw_size} bytes")
+        print(f"{'method':<16}{'level':>6}{'snapshot s':>12}{'restore s':>11}{'size':>12}{'ratio':>8}")
+
+        start = time.perf_counter()
+        shutil.copytree(src, os.path.join(tmp, 'copytree'))
+        elapsed = time.perf_counter() - start
+        print(f"{'copytree':<16}{'-':>6}{elapsed:12.3f}{'-':>11}{raw_size:12}{1.0:8.2f}")
+
+        for codec in archive.available_codecs():
+            for level in sorted({archive.CODECS[codec][1], 6 if codec != 'zstd' else 10}):
+                name = f'{codec}_{level}'
+                start = time.perf_counter()
+                path, _ = archive.write_archive(src, tmp, name, codec, level)
+                snapshot_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                archive.extract_archive(path, os.path.join(tmp, f'restore_{name}'))
+                restore_time = time.perf_counter() - start
+
+                size = os.path.getsize(path)
+                print(f"{codec:<16}{level:>6}{snapshot_time:12.3f}{restore_time:11.3f}{size:12}{raw_size / size:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
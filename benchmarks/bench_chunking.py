@@ -0,0 +1,125 @@
+"""对比大文件按内容分块保存与整个文件保存：合成的大文件每一代只有几处小改动，统计对象库的去重率和吞吐量
+
+每一代先在每个文件中随机覆盖 --edits 处 --edit-size 字节，其中 --inserts 处改为插入（文件内容整体后移），
+然后分别用分块（chunk_threshold）和整个文件（chunk_threshold=0）两种方式写入各自的对象库。
+去重率 = 所有快照的文件总字节数 / 对象库实际占用的字节数；吞吐量按快照中文件的总字节数计算。
+
+用法:
+    python benchmarks/bench_chunking.py
+    python benchmarks/bench_chunking.py --files 4 --size 16777216 --generations 10 --edits 8 --inserts 2
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import store
+
+
+def make_files(root, count, size, rnd):
+    """半随机半重复的内容，接近存档中压缩过的区块与大段相同数据混合的情况"""
+    os.makedirs(os.path.join(root, 'world'))
+    for i in range(count):
+        data = bytearray()
+        while len(data) < size:
+            data += os.urandom(4096) if rnd.random() < 0.5 else bytes([rnd.randrange(256)]) * 4096
+        with open(os.path.join(root, 'world', f'area_{i}.bin'), 'wb') as f:
+            f.write(data[:size])
+
+
+def edit_files(root, edits, edit_size, inserts, rnd):
+    for file_name in os.listdir(os.path.join(root, 'world')):
+        path = os.path.join(root, 'world', file_name)
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        for i in range(edits):
+            offset = rnd.randrange(len(data) - edit_size)
+            if i < inserts:
+                data[offset:offset] = os.urandom(edit_size)
+            else:
+                data[offset:offset + edit_size] = os.urandom(edit_size)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+def store_size(dst_dir):
+    objects_dir = os.path.join(dst_dir, store.OBJECTS_DIRNAME)
+    total = 0
+    count = 0
+    for root, _, filenames in os.walk(objects_dir):
+        for file_name in filenames:
+            total += os.path.getsize(os.path.join(root, file_name))
+            count += 1
+    return total, count
+
+
+def chunker_throughput(path):
+    """只计算切分点（不计摘要和写入），返回 (MB/s, 块数)"""
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        count = sum(1 for _ in store.iter_chunks(f))
+    return size / 1024 / 1024 / (time.perf_counter() - start), count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunked and whole-file storage of slightly edited large files.")
+    parser.add_argument('--dir', help="directory to run in (default: system temp dir)")
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--generations', type=int, default=10)
+    parser.add_argument('--edits', type=int, default=8, help="edits per file per generation")
+    parser.add_argument('--edit-size', type=int, default=64)
+    parser.add_argument('--inserts', type=int, default=2, help="how many of the edits insert bytes instead of overwriting")
+    parser.add_argument('--threshold', type=int, default=store.DEFAULT_CHUNK_THRESHOLD)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        src = os.path.join(tmp, 'save00')
+        make_files(src, args.files, args.size, rnd)
+        modes = (('chunked', args.threshold), ('whole', 0))
+        dst_dirs = {label: os.path.join(tmp, label) for label, _ in modes}
+        for dst_dir in dst_dirs.values():
+            os.makedirs(dst_dir)
+        seconds = {label: 0.0 for label, _ in modes}
+        logical = 0
+        manifests = {}
+
+        mb_per_s, chunk_count = chunker_throughput(os.path.join(src, 'world', 'area_0.bin'))
+        print(f"Chunker: {mb_per_s:.0f} MB/s, {args.size / chunk_count / 1024:.1f} KB average chunk")
+        for generation in range(args.generations):
+            if generation:
+                edit_files(src, args.edits, args.edit_size, args.inserts, rnd)
+            name = f'save00_20240101_{generation:06d}'
+            for label, threshold in modes:
+                start = time.perf_counter()
+                # 不传索引，每一代的文件都视为改动过，两种方式都要完整读取
+                manifests[label], files, _, _, _ = store.snapshot_to_store(
+                    src, dst_dirs[label], name, workers=args.workers, chunk_threshold=threshold)
+                seconds[label] += time.perf_counter() - start
+            logical += sum(entry['size'] for entry in files.values())
+
+        print(f"{args.files} files x {args.size / 1024 / 1024:.1f} MB, {args.generations} generations, "
+              f"{args.edits} edits of {args.edit_size} bytes ({args.inserts} inserts) per file per generation")
+        print(f"{'mode':<10}{'stored MB':>12}{'objects':>10}{'dedup':>10}{'snapshot MB/s':>16}{'restore MB/s':>15}")
+        for label, _ in modes:
+            stored, objects = store_size(dst_dirs[label])
+            restore_dst = os.path.join(tmp, f'restore_{label}')
+            start = time.perf_counter()
+            store.restore_from_manifest(manifests[label], restore_dst, workers=args.workers)
+            restore_seconds = time.perf_counter() - start
+            restored = args.files * args.size
+            print(f"{label:<10}{stored / 1024 / 1024:>12.1f}{objects:>10}{logical / stored:>9.1f}x"
+                  f"{logical / 1024 / 1024 / seconds[label]:>16.1f}"
+                  f"{restored / 1024 / 1024 / restore_seconds:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""热键程序的启动与常驻开销：导入耗时、启动到热键可用的时间、空闲时的内存和 CPU
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --idle 30 --runs 5 --json startup.json
+    python benchmarks/bench_startup.py --exe "noita快捷存档/Save.exe"
+
+导入部分在新的解释器中计时启动时导入的模块，并列出 psutil、tqdm 等较重的模块是否已被提前导入；
+启动部分用临时存档和备份目录运行热键程序（需要安装 keyboard，Linux 上需要 root），
+从启动到打印 "Hotkeys added successfully" 计时，之后在空闲状态下采样 --idle 秒的内存和 CPU。
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# 热键程序启动时导入的项目模块
+DAEMON_MODULES = ('jobs', 'procwatch', 'progress', 'savemanager', 'watcher')
+# 只应在第一次使用时导入的模块
+HEAVY_MODULES = ('psutil', 'tqdm', 'winsound', 'zstandard', 'keyboard', 'http.client', 'ssl', 'xml.etree.ElementTree')
+READY_MARKER = 'Hotkeys added successfully'
+
+IMPORT_PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+for name in sys.argv[1].split(','):
+    __import__(name)
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'loaded': [m for m in sys.argv[2].split(',') if m in sys.modules]}))
+'''
+
+
+def process_usage(pid):
+    """返回进程的 (常驻内存字节数, 累计 CPU 秒数)；优先使用 psutil，没有安装时在 Linux 上读取 /proc"""
+    try:
+        import psutil
+        proc = psutil.Process(pid)
+        times = proc.cpu_times()
+        return proc.memory_info().rss, times.user + times.system
+    except ImportError:
+        pass
+    with open(f'/proc/{pid}/stat', 'r') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    with open(f'/proc/{pid}/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024, cpu
+    return None, cpu
+
+
+def measure_imports(runs):
+    """每次用新的解释器导入 DAEMON_MODULES，返回 (中位数秒数, 被提前导入的较重模块)"""
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', IMPORT_PROBE, ','.join(DAEMON_MODULES), ','.join(HEAVY_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True)
+        report = json.loads(result.stdout)
+        samples.append(report['seconds'])
+        loaded = report['loaded']
+    return statistics.median(samples), loaded
+
+
+def write_config(tmp):
+    """临时存档和备份目录；noita_path 指向当前解释器，只需要一个存在的可执行文件"""
+    save = os.path.join(tmp, 'save00')
+    os.makedirs(os.path.join(save, 'world'))
+    for i in range(200):
+        with open(os.path.join(save, 'world', f'world_{i}.bin'), 'wb') as f:
+            f.write(os.urandom(4096))
+    path = os.path.join(tmp, 'config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'src_path': save, 'dst_dir': os.path.join(tmp, 'backup'), 'noita_path': sys.executable,
+                   'alert': 'off'}, f)
+    return path
+
+
+def _read_lines(stream, lines):
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def measure_daemon(command, config_path, idle, timeout):
+    """启动热键程序，返回 {'ready': 秒数, 'rss': 字节数, 'idle_cpu': 空闲时 CPU 占用比例}，无法启动时返回错误信息"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(command + ['--config', config_path], cwd=ROOT, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, env=dict(os.environ, PYTHONUNBUFFERED='1'))
+    lines = queue.Queue()
+    threading.Thread(target=_read_lines, args=(proc.stdout, lines), daemon=True).start()
+    output = []
+    try:
+        ready = None
+        while ready is None:
+            try:
+                line = lines.get(timeout=max(0.0, timeout - (time.perf_counter() - start)))
+            except queue.Empty:
+                return {'error': f"not ready after {timeout} s"}
+            if line is None:
+                return {'error': ''.join(output[-5:]).strip() or f"exited with code {proc.wait()}"}
+            output.append(line)
+            if READY_MARKER in line:
+                ready = time.perf_counter() - start
+
+        # 等后台的启动任务结束后再采样空闲状态
+        time.sleep(1.0)
+        rss_start, cpu_start = process_usage(proc.pid)
+        time.sleep(idle)
+        rss, cpu = process_usage(proc.pid)
+        return {'ready': ready, 'rss': rss, 'idle_cpu': (cpu - cpu_start) / idle}
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure hotkey daemon startup latency and idle footprint.")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--idle', type=float, default=10.0, help="seconds of idle sampling after startup")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--exe', help="packaged executable to launch instead of python exe4.py")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    import_seconds, loaded = measure_imports(args.runs)
+    print(f"{'import daemon modules':<24}{import_seconds * 1000:10.1f} ms")
+    if loaded:
+        print(f"Heavy modules imported at startup: {', '.join(loaded)}")
+
+    command = [args.exe] if args.exe else [sys.executable, os.path.join(ROOT, 'exe4.py')]
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = write_config(tmp)
+        for _ in range(args.runs):
+            result = measure_daemon(command, config_path, args.idle, args.timeout)
+            if 'error' in result:
+                print(f"Could not start the hotkey daemon: {result['error']}")
+                break
+            runs.append(result)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'import_seconds': import_seconds,
+        'heavy_modules_loaded': loaded,
+        'runs': runs,
+    }
+    if runs:
+        report['ready_seconds'] = statistics.median(r['ready'] for r in runs)
+        report['idle_rss'] = statistics.median(r['rss'] for r in runs if r['rss'] is not None)
+        report['idle_cpu'] = statistics.median(r['idle_cpu'] for r in runs)
+        print(f"{'ready (hotkeys added)':<24}{report['ready_seconds'] * 1000:10.1f} ms")
+        print(f"{'idle RSS':<24}{report['idle_rss'] / 1024 / 1024:10.1f} MB")
+        print(f"{'idle CPU':<24}{report['idle_cpu'] * 100:10.2f} %")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""快照与恢复的完整基准测试：在合成的 Noita 存档上，对每种快照方式、复制方式和线程数
+分别计时首次快照、增量快照、列出（读目录表与重建目录表）、校验和恢复，输出汇总表和 JSON
+
+用法:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --chunks 20000 --workers 1,4,8,16 --json result.json
+    python benchmarks/bench_suite.py --dir /mnt/cow --strategies reflink,copy
+
+每组设置重复 --repeat 次取中位数；把不同版本的 JSON 结果放在一起比较即可发现性能回退。
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import contextlib
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import catalog
+import copyengine
+import savemanager
+
+PHASES = ('snapshot', 'incremental', 'list', 'rebuild', 'verify', 'restore')
+
+
+def make_save_tree(root, chunks=5000, chunk_size=4096, large_files=3, large_size=8 * 1024 * 1024, per_dir=500):
+    """生成类似 save00 的目录：world 下按子目录分组的大量小区块文件，
+    几个大文件（类似 world_state.xml、player.xml），以及多层嵌套的 persistent/stats 目录"""
+    for i in range(chunks):
+        sub = os.path.join(root, 'world', f'area{i // per_dir}')
+        os.makedirs(sub, exist_ok=True)
+        # 区块文件大部分内容重复，压缩率接近真实存档
+        noise = os.urandom(chunk_size // 8)
+        data = (noise + bytes([i % 256]) * (chunk_size // 8) * 7)[:chunk_size]
+        with open(os.path.join(sub, f'world_{i}.bin'), 'wb') as f:
+            f.write(data)
+    for i in range(large_files):
+        block = os.urandom(64 * 1024)
+        with open(os.path.join(root, f'large_{i}.xml'), 'wb') as f:
+            for _ in range(large_size // len(block)):
+                f.write(block)
+    for sub in ('persistent/flags', 'persistent/bones_new', 'stats/sessions'):
+        path = os.path.join(root, *sub.split('/'))
+        os.makedirs(path, exist_ok=True)
+        for i in range(20):
+            with open(os.path.join(path, f'{i}.txt'), 'w') as f:
+                f.write(f'{sub} {i}\n')
+
+
+def touch_chunks(root, count):
+    """模拟一次游戏保存：改写少量区块文件"""
+    world = os.path.join(root, 'world')
+    changed = 0
+    for dirpath, _, filenames in os.walk(world):
+        for file_name in filenames:
+            if changed >= count:
+                return
+            with open(os.path.join(dirpath, file_name), 'r+b') as f:
+                f.write(os.urandom(16))
+            changed += 1
+
+
+def tree_stats(root):
+    files = 0
+    size = 0
+    for dirpath, _, filenames in os.walk(root):
+        for file_name in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, file_name))
+    return files, size
+
+
+def supported_strategies(tmp):
+    """探测当前目录所在文件系统支持哪些复制方式"""
+    probe = os.path.join(tmp, 'probe')
+    with open(probe, 'wb') as f:
+        f.write(b'probe')
+    supported = []
+    for name in copyengine.STRATEGIES:
+        try:
+            copyengine.fast_copy(probe, probe + '.' + name, strategy=name)
+            supported.append(name)
+        except OSError:
+            pass
+    return supported
+
+
+def timed(func):
+    """静默执行 func 并返回耗时，SaveManager 的进度输出不计入结果"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+
+def run_case(tmp, src, mode, strategy, workers, repeat, touch):
+    """对一组设置计时各阶段，返回 {阶段: 中位数秒数}"""
+    samples = {phase: [] for phase in PHASES}
+    for r in range(repeat):
+        case_dir = os.path.join(tmp, f'{mode}_{strategy}_{workers}_{r}')
+        save = os.path.join(case_dir, 'save00')
+        copyengine.set_strategy(None)
+        copyengine.copytree(src, save)
+        copyengine.set_strategy(strategy)
+        manager = savemanager.SaveManager({
+            'src_path': save,
+            'dst_dir': os.path.join(case_dir, 'backup'),
+            'snapshot_mode': mode,
+            'copy_workers': workers,
+            'verify_before_restore': False,
+        })
+        manager.is_game_running = lambda: False
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.load()
+
+        samples['snapshot'].append(timed(lambda: manager.snapshot('save00_20240101_000000')))
+        touch_chunks(save, touch)
+        samples['incremental'].append(timed(lambda: manager.snapshot('save00_20240101_000001')))
+        samples['list'].append(timed(lambda: (manager.load(), manager.list())))
+        samples['rebuild'].append(timed(lambda: catalog.rebuild(manager.dst_dir)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.load()
+        samples['verify'].append(timed(lambda: manager.verify(manager.backup_path(1))))
+        samples['restore'].append(timed(lambda: manager.restore(1)))
+    copyengine.set_strategy(None)
+    return {phase: statistics.median(values) for phase, values in samples.items()}
+
+
+def print_table(results):
+    print(f"{'mode':<9}{'strategy':<17}{'workers':>7}" + ''.join(f"{phase:>13}" for phase in PHASES))
+    for result in results:
+        print(f"{result['mode']:<9}{result['strategy']:<17}{result['workers']:>7}"
+              + ''.join(f"{result['seconds'][phase] * 1000:>11.1f}ms" for phase in PHASES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark snapshot, list, verify and restore on a synthetic save.")
+    parser.add_argument('--dir', help="directory to run in (default: system temp dir); pick the disk you back up to")
+    parser.add_argument('--chunks', type=int, default=5000, help="number of small world/*.bin chunk files")
+    parser.add_argument('--chunk-size', type=int, default=4096)
+    parser.add_argument('--large-files', type=int, default=3)
+    parser.add_argument('--large-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--touch', type=int, default=50, help="chunks rewritten before the incremental snapshot")
+    parser.add_argument('--modes', default='folder,store,archive')
+    parser.add_argument('--strategies', default='auto',
+                        help="comma separated copy strategies, 'auto' for every one the filesystem supports")
+    parser.add_argument('--workers', default='1,8')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--json', help="write results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        src = os.path.join(tmp, 'source', 'save00')
+        make_save_tree(src, args.chunks, args.chunk_size, args.large_files, args.large_size)
+        files, size = tree_stats(src)
+        print(f"Synthetic save: {files} files, {size} bytes in {tmp}")
+
+        supported = supported_strategies(tmp)
+        if args.strategies == 'auto':
+            strategies = supported
+        else:
+            strategies = [s for s in args.strategies.split(',') if s in supported]
+            for skipped in set(args.strategies.split(',')) - set(strategies):
+                print(f"Skipping copy strategy {skipped}: not supported here.")
+
+        results = []
+        for mode in args.modes.split(','):
+            # 压缩快照不经过复制引擎，只需按线程数测一次
+            mode_strategies = strategies if mode != 'archive' else strategies[-1:]
+            for strategy in mode_strategies:
+                for workers in [int(w) for w in args.workers.split(',')]:
+                    seconds = run_case(tmp, src, mode, strategy, workers, args.repeat, args.touch)
+                    results.append({'mode': mode, 'strategy': strategy, 'workers': workers, 'seconds': seconds})
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'tree': {'files': files, 'bytes': size, 'chunks': args.chunks, 'chunk_size': args.chunk_size,
+                 'large_files': args.large_files, 'large_size': args.large_size},
+        'repeat': args.repeat,
+        'results': results,
+    }
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
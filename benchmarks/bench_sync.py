@@ -0,0 +1,122 @@
+"""存储后端同步的基准测试：把合成存档的快照同步到镜像目录和内存中的 S3 替身，离线即可运行
+
+对每个后端分别计时首次同步、增量快照后的同步（只应上传变化的对象）以及取回（pull）到空目录，
+S3 替身还会报告客户端建立的连接数，用来确认连接被复用：首次同步之后再做几次增量同步，连接数应保持不变，
+否则以非零状态退出。
+
+用法:
+    python benchmarks/bench_sync.py
+    python benchmarks/bench_sync.py --chunks 20000 --part-size 5242880 --workers 8
+    python benchmarks/bench_sync.py --endpoint http://127.0.0.1:9000 --bucket noita   # 真实的 S3 兼容服务
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backends
+import integrity
+import replicate
+import savemanager
+from bench_suite import make_save_tree, touch_chunks
+from s3_standin import start_server
+
+
+def timed_quiet(func):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        return time.perf_counter() - start, result
+
+
+def run_backend(label, backend, manager, tmp, touch, save, name, workers, server=None, repeats=3):
+    replicator = replicate.Replicator(manager.dst_dir, [backend], lambda: manager.catalog, manager.oplog,
+                                      workers=workers)
+    seconds, (files, size) = timed_quiet(lambda: replicator.sync(backend))
+    print(f"{label:<8}{'first sync':<18}{files:>8}{size / 1024 / 1024:>12.1f}{seconds:>10.3f}"
+          f"{size / 1024 / 1024 / seconds if seconds else 0:>10.1f}")
+
+    touch_chunks(save, touch)
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.snapshot(name)
+    seconds, (files, size) = timed_quiet(lambda: replicator.sync(backend))
+    print(f"{label:<8}{'incremental sync':<18}{files:>8}{size / 1024 / 1024:>12.1f}{seconds:>10.3f}"
+          f"{size / 1024 / 1024 / seconds if seconds else 0:>10.1f}")
+
+    # 连接在同步之间复用，之后的同步不应再建立新连接
+    connections = server.connections if server is not None else None
+    for i in range(repeats):
+        touch_chunks(save, touch)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.snapshot(f'{name}_{i}')
+            replicator.sync(backend)
+    leaked = server is not None and server.connections != connections
+    if server is not None:
+        print(f"{label:<8}{repeats} more syncs opened {server.connections - connections} new connections")
+
+    pulled = os.path.join(tmp, f'pulled_{label}')
+    seconds, (files, size) = timed_quiet(lambda: replicate.pull(backend, pulled, manager.copy_workers))
+    print(f"{label:<8}{'pull':<18}{files:>8}{size / 1024 / 1024:>12.1f}{seconds:>10.3f}"
+          f"{size / 1024 / 1024 / seconds if seconds else 0:>10.1f}")
+    manifest = os.path.join(pulled, name + '.manifest.json')
+    problems = integrity.verify_snapshot(manifest)
+    if problems:
+        print(f"Pulled snapshot failed verification: {problems[:3]}")
+    if server is not None:
+        print(f"{label:<8}{server.connections} connections for {server.requests} requests")
+    return leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark syncing backups to a mirror and an S3-compatible backend.")
+    parser.add_argument('--dir', help="directory to run in (default: system temp dir)")
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--large-files', type=int, default=3)
+    parser.add_argument('--large-size', type=int, default=16 * 1024 * 1024)
+    parser.add_argument('--touch', type=int, default=50, help="chunks rewritten before the incremental snapshot")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--part-size', type=int, default=backends.DEFAULT_PART_SIZE)
+    parser.add_argument('--endpoint', help="use a real S3-compatible service instead of the in-memory stand-in")
+    parser.add_argument('--bucket', default='noita')
+    parser.add_argument('--access-key', default='test')
+    parser.add_argument('--secret-key', default='test')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        save = os.path.join(tmp, 'save00')
+        make_save_tree(save, args.chunks, large_files=args.large_files, large_size=args.large_size)
+        manager = savemanager.SaveManager({'src_path': save, 'dst_dir': os.path.join(tmp, 'backup'),
+                                           'snapshot_mode': 'store'})
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.load()
+            manager.snapshot('save00_20240101_000000')
+
+        server = None
+        endpoint = args.endpoint
+        if endpoint is None:
+            server = start_server()
+            endpoint = server.endpoint
+        s3 = backends.S3Backend(endpoint, args.bucket, args.access_key, args.secret_key, prefix='bench',
+                                part_size=args.part_size, workers=args.workers)
+        mirror = backends.LocalBackend(os.path.join(tmp, 'mirror'))
+
+        print(f"{'backend':<8}{'phase':<18}{'files':>8}{'MB':>12}{'s':>10}{'MB/s':>10}")
+        run_backend('mirror', mirror, manager, tmp, args.touch, save, 'save00_20240101_000001', args.workers)
+        leaked = run_backend('s3', s3, manager, tmp, args.touch, save, 'save00_20240101_000002', args.workers,
+                             server)
+        s3.close()
+        if server is not None:
+            server.shutdown()
+    if leaked:
+        print("FAIL repeated syncs opened new S3 connections instead of reusing them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""测量按清单校验快照的耗时，用于判断能否在每次恢复前同步校验
+
+用法: python benchmarks/bench_verify.py [文件数] [线程数,线程数,...]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import archive
+import integrity
+import store
+from bench_copy import make_tree
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    worker_counts = [int(w) for w in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 4, 8]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'save00')
+        make_tree(src, file_count, compressible=True)
+        dst_dir = os.path.join(tmp, 'backup')
+        os.makedirs(dst_dir)
+        print(f"Synthetic tree: {file_count} files")
+
+        folder = os.path.join(dst_dir, 'save00_20240101_000000')
+        files, _, _, _, _ = store.incremental_copytree(src, folder)
+        store.write_sidecar_manifest(dst_dir, 'folder', 'save00_20240101_000000', src, files)
+        manifest, _, _, _, _ = store.snapshot_to_store(src, dst_dir, 'save00_20240101_000001')
+        archive_path, files = archive.write_archive(src, dst_dir, 'save00_20240101_000002')
+        store.write_sidecar_manifest(dst_dir, 'archive', 'save00_20240101_000002', src, files)
+
+        for label, path, counts in (('folder', folder, worker_counts),
+                                    ('store', manifest, worker_counts),
+                                    ('archive', archive_path, [1])):
+            for workers in counts:
+                start = time.perf_counter()
+                problems = integrity.verify_snapshot(path, workers)
+                elapsed = time.perf_counter() - start
+                print(f"{label:<10}x{workers:<4}{elapsed:8.3f} s  problems={len(problems)}")
+
+
+if __name__ == "__main__":
+    main()
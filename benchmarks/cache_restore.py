@@ -0,0 +1,107 @@
+"""检查开启恢复缓存后，第二次恢复同一快照（包括恢复前校验）不再读取备份目录中的快照内容
+
+对文件夹和对象库快照各恢复两次（其中有一个经由 mmap 缓存或按块保存的大文件），
+用审计钩子记录以只读方式打开的备份内容文件（快照文件夹或 .objects 中的文件），第二次恢复打开的字节数应为 0，并且恢复出的存档与快照内容相同。有任何一项不符合时以非零状态退出。
+
+用法: python benchmarks/cache_restore.py [文件数] [线程数]
+"""
+import io
+import os
+import sys
+import contextlib
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import savemanager
+import store
+from bench_copy import make_tree
+from fault_restore import tree_state
+
+
+class ReadCounter:
+    """统计以读方式打开的 roots 之下的文件的总字节数"""
+
+    def __init__(self):
+        self.roots = ()
+        self.bytes = 0
+        self.files = 0
+        self._lock = threading.Lock()
+
+    def hook(self, event, args):
+        if event != 'open' or not self.roots or not isinstance(args[0], str):
+            return
+        path, mode, flags = args
+        writing = (mode is not None and any(c in mode for c in 'wax+')) or \
+            (mode is None and flags & (os.O_WRONLY | os.O_RDWR))
+        if writing or not os.path.abspath(path).startswith(self.roots):
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    @contextlib.contextmanager
+    def counting(self, roots):
+        self.roots = tuple(os.path.join(os.path.abspath(root), '') for root in roots)
+        self.bytes = self.files = 0
+        try:
+            yield self
+        finally:
+            self.roots = ()
+
+
+def run_mode(tmp, mode, file_count, workers, counter, failures):
+    root = os.path.join(tmp, mode)
+    save = os.path.join(root, 'save00')
+    dst_dir = os.path.join(root, 'backup')
+    make_tree(save, file_count)
+    # 一个大文件：文件夹快照中超过 mmap 下限，对象库快照中按内容分块
+    with open(os.path.join(save, 'world', 'big.bin'), 'wb') as f:
+        f.write(os.urandom(6 * 1024 * 1024))
+    config = {'src_path': save, 'dst_dir': dst_dir, 'snapshot_mode': mode, 'copy_workers': workers,
+              'restore_cache_bytes': 256 * 1024 * 1024, 'verify_before_restore': True}
+    manager = savemanager.SaveManager(config)
+    manager.is_game_running = lambda: False
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.load()
+        manager.snapshot()
+    expected = tree_state(save)
+    backup = manager.backup_path(1)
+    # 文件夹快照的内容在快照文件夹中，对象库快照的内容在 .objects 中；清单和目录表不算
+    content_root = backup if mode == 'folder' else os.path.join(dst_dir, store.OBJECTS_DIRNAME)
+
+    for attempt in range(2):
+        with open(os.path.join(save, 'player.xml'), 'w') as f:
+            f.write('<Entity />')
+        with counter.counting([content_root]), contextlib.redirect_stdout(io.StringIO()):
+            manager.restore(1)
+        print(f"{mode:<8}restore {attempt + 1}: {counter.files} backup files opened, {counter.bytes} bytes")
+        if tree_state(save) != expected:
+            failures.append(f"{mode}: restore {attempt + 1} did not reproduce the snapshot")
+    if counter.bytes:
+        failures.append(f"{mode}: the repeated restore read {counter.bytes} bytes from the backup folder")
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    counter = ReadCounter()
+    sys.addaudithook(counter.hook)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('folder', 'store'):
+            run_mode(tmp, mode, file_count, workers, counter, failures)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("Repeated restores were served from the restore cache.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""故障注入：在恢复的任意一个文件复制失败、或任意一次目录改名失败时，检查现有存档是否保持不变
+
+对文件夹和对象库快照各做一次完整恢复，逐个让第 k 次文件复制抛出异常（k 取遍快照中的每个文件），
+再逐个让 swap 的每一次改名失败；每次之后比较存档的文件内容和目录与恢复前是否完全相同。
+最后模拟在两次改名之间崩溃（存档已移走、回滚副本还在），检查 swap.recover 能否把存档放回原处。
+有任何一项不符合时以非零状态退出。
+
+用法: python benchmarks/fault_restore.py [文件数] [线程数]
+"""
+import io
+import os
+import sys
+import contextlib
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import copyengine
+import savemanager
+import store
+import swap
+from bench_copy import make_tree
+
+
+class InjectedFault(OSError):
+    pass
+
+
+def tree_state(root):
+    """存档的全部文件摘要和目录，用来判断恢复失败后存档是否原样保留"""
+    if not os.path.isdir(root):
+        return None
+    files = {}
+    dirs = set()
+    for current, dirnames, filenames in os.walk(root):
+        for dirname in dirnames:
+            dirs.add(store.relpath_key(os.path.join(current, dirname), root))
+        for file_name in filenames:
+            path = os.path.join(current, file_name)
+            files[store.relpath_key(path, root)] = store.hash_file(path)
+    return files, dirs
+
+
+@contextlib.contextmanager
+def fail_call(module, name, fail_at):
+    """让 module.name 的第 fail_at 次调用（从 0 开始，可以是多个）抛出 InjectedFault"""
+    original = getattr(module, name)
+    fail_at = set(fail_at)
+    calls = [0]
+    lock = threading.Lock()
+
+    def wrapper(*args, **kwargs):
+        with lock:
+            call = calls[0]
+            calls[0] += 1
+        if call in fail_at:
+            raise InjectedFault(f"injected failure in {name} call {call}")
+        return original(*args, **kwargs)
+
+    setattr(module, name, wrapper)
+    try:
+        yield calls
+    finally:
+        setattr(module, name, original)
+
+
+def leftovers(save):
+    """恢复失败后不应留下暂存目录"""
+    return [path for path in (swap.staging_path(save), swap.rollback_path(save)) if os.path.exists(path)]
+
+
+def check_restore(manager, save, expected, module, name, fail_at, label, failures):
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            with fail_call(module, name, fail_at):
+                manager.restore(1)
+            failures.append(f"{label}: restore succeeded despite the injected failure")
+            return
+        except OSError:
+            # 并行复制中的异常被 run_parallel 汇总为 shutil.Error
+            pass
+    if tree_state(save) != expected:
+        failures.append(f"{label}: live save changed")
+    elif leftovers(save):
+        failures.append(f"{label}: left {leftovers(save)} behind")
+
+
+def run_mode(tmp, mode, file_count, workers, failures):
+    root = os.path.join(tmp, mode)
+    save = os.path.join(root, 'save00')
+    make_tree(save, file_count)
+    os.makedirs(os.path.join(save, 'emptydir'))
+    config = {'src_path': save, 'dst_dir': os.path.join(root, 'backup'), 'snapshot_mode': mode,
+              'copy_workers': workers, 'chunk_threshold': 0, 'verify_before_restore': False}
+    manager = savemanager.SaveManager(config)
+    manager.is_game_running = lambda: False
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.load()
+        manager.snapshot()
+    # 备份之后改动存档，失败的恢复如果写进了存档就能看出来
+    with open(os.path.join(save, 'world', 'area0', 'world_0.bin'), 'wb') as f:
+        f.write(b'changed after the backup')
+    with open(os.path.join(save, 'player.xml'), 'w') as f:
+        f.write('<Entity />')
+    expected = tree_state(save)
+
+    scenarios = 0
+    for k in range(file_count):
+        check_restore(manager, save, expected, copyengine, 'fast_copy', [k], f"{mode}: copy #{k}", failures)
+        scenarios += 1
+    # 第 0 次改名把存档移到回滚位置，第 1 次把暂存目录改成存档，第 2 次是失败后把旧存档改回原处
+    for k in range(2):
+        check_restore(manager, save, expected, swap, '_rename', [k], f"{mode}: rename #{k}", failures)
+        scenarios += 1
+
+    # 两次改名之间崩溃：暂存目录改名失败，而且回滚也失败，存档此时只在回滚位置
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            with fail_call(swap, '_rename', [1, 2]):
+                manager.restore(1)
+        except OSError:
+            pass
+        recovered = swap.recover(save)
+    scenarios += 1
+    if not recovered or tree_state(save) != expected or leftovers(save):
+        failures.append(f"{mode}: swap.recover did not put the save back after an interrupted swap")
+
+    # 不注入故障时恢复应当成功
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.restore(1)
+    if tree_state(save) == expected:
+        failures.append(f"{mode}: the unfaulted restore did not change the save")
+    return scenarios
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    failures = []
+    scenarios = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('folder', 'store'):
+            scenarios += run_mode(tmp, mode, file_count, workers, failures)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"All {scenarios} fault scenarios left the live save intact.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""最小的 S3 兼容服务器，数据保存在内存中，用于离线测试 S3 后端
+
+只实现同步所需的请求：PUT/GET/HEAD 对象、ListObjectsV2、分块上传（创建、上传分块、完成、中止），
+保存 x-amz-meta-* 元数据，不校验签名。支持 HTTP/1.1 长连接，并统计接受的连接数以确认客户端复用了连接。
+
+用法:
+    python benchmarks/s3_standin.py --port 9000
+    然后在 config.json 的 backends 中加入
+    {"type": "s3", "endpoint": "http://127.0.0.1:9000", "bucket": "noita", "access_key": "test", "secret_key": "test"}
+"""
+import uuid
+import socket
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.sax.saxutils import escape
+
+MAX_KEYS = 1000
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, _Handler)
+        self.lock = threading.Lock()
+        # (bucket, key) -> (内容, 元数据)
+        self.objects = {}
+        # upload_id -> (bucket, key, 元数据, {分块号: 内容})
+        self.uploads = {}
+        self.connections = 0
+        self.requests = 0
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # 响应头和内容分两次写出，关闭 Nagle 算法以免每个请求都等待一次延迟确认
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        url = urlsplit(self.path)
+        parts = unquote(url.path).lstrip('/').split('/', 1)
+        bucket = parts[0]
+        key = parts[1] if len(parts) > 1 else ''
+        query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        with self.server.lock:
+            self.server.requests += 1
+        return bucket, key, query
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _metadata(self):
+        return {name.lower(): value for name, value in self.headers.items() if name.lower().startswith('x-amz-meta-')}
+
+    def do_PUT(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        with self.server.lock:
+            if 'uploadId' in query:
+                upload = self.server.uploads.get(query['uploadId'])
+                if upload is None:
+                    return self._send(404, b'<Error><Code>NoSuchUpload</Code></Error>')
+                upload[3][int(query['partNumber'])] = body
+            else:
+                self.server.objects[(bucket, key)] = (body, self._metadata())
+        self._send(200, headers={'ETag': etag})
+
+    def do_POST(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        with self.server.lock:
+            if 'uploads' in query:
+                upload_id = uuid.uuid4().hex
+                self.server.uploads[upload_id] = (bucket, key, self._metadata(), {})
+                return self._send(200, (f"<InitiateMultipartUploadResult><Bucket>{escape(bucket)}</Bucket>"
+                                        f"<Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>"
+                                        f"</InitiateMultipartUploadResult>").encode('utf-8'))
+            upload = self.server.uploads.pop(query.get('uploadId'), None)
+            if upload is None:
+                return self._send(404, b'<Error><Code>NoSuchUpload</Code></Error>')
+            _, _, metadata, parts = upload
+            self.server.objects[(bucket, key)] = (b''.join(parts[n] for n in sorted(parts)), metadata)
+        self._send(200, b'<CompleteMultipartUploadResult></CompleteMultipartUploadResult>')
+
+    def do_DELETE(self):
+        bucket, key, query = self._parse()
+        with self.server.lock:
+            if 'uploadId' in query:
+                self.server.uploads.pop(query['uploadId'], None)
+            else:
+                self.server.objects.pop((bucket, key), None)
+        self._send(204)
+
+    def do_GET(self):
+        bucket, key, query = self._parse()
+        if not key:
+            return self._list(bucket, query)
+        with self.server.lock:
+            found = self.server.objects.get((bucket, key))
+        if found is None:
+            return self._send(404, b'<Error><Code>NoSuchKey</Code></Error>')
+        body, metadata = found
+        self._send(200, body, metadata)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def _list(self, bucket, query):
+        prefix = query.get('prefix', '')
+        with self.server.lock:
+            keys = sorted((key, len(body)) for (b, key), (body, _) in self.server.objects.items()
+                          if b == bucket and key.startswith(prefix))
+        start = query.get('continuation-token')
+        if start:
+            keys = [item for item in keys if item[0] > start]
+        page = keys[:MAX_KEYS]
+        truncated = len(keys) > MAX_KEYS
+        xml = ['<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+               f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>",
+               f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"]
+        if truncated:
+            xml.append(f"<NextContinuationToken>{escape(page[-1][0])}</NextContinuationToken>")
+        for key, size in page:
+            xml.append(f"<Contents><Key>{escape(key)}</Key><Size>{size}</Size></Contents>")
+        xml.append('</ListBucketResult>')
+        self._send(200, ''.join(xml).encode('utf-8'))
+
+
+def start_server(host='127.0.0.1', port=0):
+    """在后台线程中启动服务器并返回它，port 为 0 时自动选择空闲端口"""
+    server = StandinServer((host, port))
+    threading.Thread(target=server.serve_forever, name='s3-standin', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal in-memory S3-compatible server for offline testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    args = parser.parse_args()
+    server = StandinServer((args.host, args.port))
+    print(f"S3 stand-in listening on {server.endpoint} (any bucket, any credentials)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
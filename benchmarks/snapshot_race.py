@@ -0,0 +1,91 @@
+"""检查对象库快照期间游戏新建子目录时，清单记录了新目录并且快照可以完整恢复
+
+第一次写入对象时在存档中新建一个两层的子目录并放入文件，make_consistent 会在复制结束后补存这个文件；
+检查清单的 dirs 包含新目录、恢复到空目录成功且内容与存档相同，
+再去掉清单中的这些目录（旧版本写出的清单）检查恢复仍然成功。有任何一项不符合时以非零状态退出。
+
+用法: python benchmarks/snapshot_race.py [文件数] [线程数]
+"""
+import io
+import os
+import sys
+import contextlib
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import store
+from bench_copy import make_tree
+from fault_restore import tree_state
+
+NEW_DIRS = ('new', 'new/sub')
+NEW_FILE = 'new/sub/added.bin'
+
+
+@contextlib.contextmanager
+def create_during_copy(src):
+    """第一次调用 store.put_object 时在 src 中新建 NEW_FILE"""
+    original = store.put_object
+    lock = threading.Lock()
+    created = []
+
+    def wrapper(dst_dir, path):
+        with lock:
+            if not created:
+                target = os.path.join(src, *NEW_FILE.split('/'))
+                os.makedirs(os.path.dirname(target))
+                with open(target, 'wb') as f:
+                    f.write(os.urandom(1000))
+                created.append(target)
+        return original(dst_dir, path)
+
+    store.put_object = wrapper
+    try:
+        yield created
+    finally:
+        store.put_object = original
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'save00')
+        dst_dir = os.path.join(tmp, 'backup')
+        make_tree(src, file_count)
+        os.makedirs(dst_dir)
+        with create_during_copy(src) as created, contextlib.redirect_stdout(io.StringIO()):
+            manifest_path, files, _, _, consistent = store.snapshot_to_store(
+                src, dst_dir, 'save00_20240101_000000', workers=workers, retries=2)
+        if not created or NEW_FILE not in files or not consistent:
+            failures.append("the file created during the snapshot was not picked up")
+        manifest = store.load_manifest(manifest_path)
+        missing = [rel_dir for rel_dir in NEW_DIRS if rel_dir not in manifest['dirs']]
+        if missing:
+            failures.append(f"manifest dirs lack {missing}")
+        expected = tree_state(src)
+
+        old_manifest = dict(manifest, dirs=[rel_dir for rel_dir in manifest['dirs'] if rel_dir not in NEW_DIRS])
+        cases = (('manifest', manifest), ('manifest without the new dirs', old_manifest))
+        for i, (label, restore_manifest) in enumerate(cases):
+            dst = os.path.join(tmp, f'restore{i}')
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    store.restore_from_manifest(manifest_path, dst, workers=workers, manifest=restore_manifest)
+            except OSError as e:
+                failures.append(f"restore from the {label} failed: {e}")
+                continue
+            if tree_state(dst) != expected:
+                failures.append(f"restore from the {label} differs from the save")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("A directory created during the snapshot was recorded and restored.")
+
+
+if __name__ == "__main__":
+    main()
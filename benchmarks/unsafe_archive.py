@@ -0,0 +1,104 @@
+"""检查所有读取压缩快照的入口都拒绝会写到目标目录之外的成员名
+
+对每个不安全的成员名（.. 、绝对路径、反斜杠分隔的 .. 、盘符和 UNC 前缀）生成一个 gz 压缩快照，
+依次用浏览、部分解压、完整解压、差异恢复和校验去读取，每一项都应报错并且目标目录之外没有出现文件。
+另外检查 archive.member_path 对解析后跑出目标目录的路径报错。有任何一项不符合时以非零状态退出。
+
+用法: python benchmarks/unsafe_archive.py
+"""
+import io
+import os
+import sys
+import gzip
+import tarfile
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import archive
+import browse
+import diffrestore
+import integrity
+import store
+
+UNSAFE_NAMES = [
+    '../escape.txt',
+    'a/../../escape.txt',
+    '/tmp/escape.txt',
+    '..\\escape.txt',
+    'a\\..\\..\\escape.txt',
+    '\\escape.txt',
+    'C:escape.txt',
+    'C:\\escape.txt',
+    '\\\\server\\share\\escape.txt',
+]
+
+
+def write_evil_archive(path, name):
+    with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as compressed:
+        with tarfile.open(fileobj=compressed, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for member_name in ('ok.txt', name):
+                tarinfo = tarfile.TarInfo(member_name)
+                tarinfo.size = 2
+                tar.addfile(tarinfo, io.BytesIO(b'hi'))
+
+
+def readers(path, dst):
+    hasher = store.new_hasher()
+    hasher.update(b'hi')
+    entry = {'size': 2, 'mtime_ns': 0, 'hash': hasher.hexdigest()}
+    files = {name: entry for name in ['ok.txt'] + UNSAFE_NAMES}
+    return [
+        ('browse members', lambda: browse._archive_members(path)),
+        ('browse extract', lambda: browse._extract_from_archive(path, files, sorted(files), dst, None)),
+        ('extract_archive', lambda: archive.extract_archive(path, dst)),
+        ('diff restore', lambda: diffrestore._diff_restore_archive(path, dst, False, None, None)),
+        ('verify', lambda: integrity._verify_archive(path, {'files': files})),
+    ]
+
+
+def main():
+    failures = []
+    checks = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, name in enumerate(UNSAFE_NAMES):
+            case_dir = os.path.join(tmp, f'case{i}')
+            dst = os.path.join(case_dir, 'save00')
+            os.makedirs(dst)
+            path = os.path.join(case_dir, 'save00_20240101_000000.tar.gz')
+            write_evil_archive(path, name)
+            for label, read in readers(path, dst):
+                checks += 1
+                try:
+                    read()
+                    failures.append(f"{label} accepted {name!r}")
+                except ValueError:
+                    pass
+                except Exception as e:
+                    failures.append(f"{label} did not reject {name!r}: {type(e).__name__}: {e}")
+            outside = [entry for entry in os.listdir(case_dir) if entry not in ('save00', os.path.basename(path))]
+            if outside:
+                failures.append(f"{name!r} left {outside} outside the destination")
+
+        dst = os.path.join(tmp, 'save00')
+        os.makedirs(os.path.join(dst, 'world'))
+        os.symlink(tmp, os.path.join(dst, 'link'))
+        for name in ('world/ok.txt', 'link/escape.txt'):
+            checks += 1
+            try:
+                archive.member_path(dst, name)
+                if name != 'world/ok.txt':
+                    failures.append(f"member_path accepted {name!r}")
+            except ValueError:
+                if name == 'world/ok.txt':
+                    failures.append(f"member_path rejected {name!r}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"All {checks} unsafe archive checks passed.")
+
+
+if __name__ == "__main__":
+    main()
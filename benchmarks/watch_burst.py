@@ -0,0 +1,52 @@
+"""模拟游戏保存时的突发写入，检查自动快照的去抖效果和空闲时的 CPU 占用
+
+用法: python benchmarks/watch_burst.py [突发次数] [安静秒数]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import watcher
+from bench_copy import make_tree
+
+
+def main():
+    bursts = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    quiet_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'save00')
+        make_tree(root, 200)
+        triggered = []
+        auto = watcher.AutoSnapshotter(root, lambda: triggered.append(time.monotonic()), quiet_seconds)
+        auto.start()
+        time.sleep(0.5)
+        source = watcher.make_source(root)
+        print(f"Watching {root} with {type(source).__name__}")
+        source.close()
+
+        for burst in range(bursts):
+            start = time.monotonic()
+            # 一次保存：约 0.5 秒内改写几十个区块文件，并新建一个子目录
+            os.makedirs(os.path.join(root, 'world', f'new{burst}'), exist_ok=True)
+            for i in range(50):
+                with open(os.path.join(root, 'world', f'area0', f'world_{i}.bin'), 'wb') as f:
+                    f.write(os.urandom(4096))
+                time.sleep(0.01)
+            with open(os.path.join(root, 'world', f'new{burst}', 'chunk.bin'), 'wb') as f:
+                f.write(b'x')
+            time.sleep(quiet_seconds + 1.5)
+            count = len([t for t in triggered if t >= start])
+            print(f"burst {burst + 1}: {count} snapshot(s) triggered")
+
+        cpu_start = time.process_time()
+        time.sleep(5)
+        print(f"idle CPU over 5 s: {time.process_time() - cpu_start:.4f} s, total snapshots: {len(triggered)}")
+        auto.stop()
+
+
+if __name__ == "__main__":
+    main()
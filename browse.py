@@ -0,0 +1,122 @@
+"""浏览快照：列出内容、只取回部分文件、比较两个快照
+
+都基于快照清单（每个文件的大小、修改时间和摘要），列出和比较不需要遍历快照目录，也不读取文件内容；
+只有旧版本留下的没有清单的快照才退回到遍历目录或读取压缩包的成员列表。
+"""
+import os
+import shutil
+import fnmatch
+import functools
+
+import archive
+import catalog
+import diffrestore
+import integrity
+import store
+
+
+def snapshot_files(backup_path, content_path=None):
+    """返回快照中的文件 {相对路径: {'size', 'mtime_ns', 'hash'}}，没有清单的快照中没有 'hash'。
+
+    content_path 为文件夹快照中实际存放存档内容的目录，默认为快照本身
+    """
+    manifest_path = integrity.manifest_for(backup_path)
+    if manifest_path is not None:
+        return store.load_manifest(manifest_path)['files']
+    if archive.is_archive(backup_path):
+        return _archive_members(backup_path)
+    files = {}
+    for rel_file, (size, mtime_ns) in store.scan_tree(content_path or backup_path).items():
+        files[rel_file] = {'size': size, 'mtime_ns': mtime_ns}
+    return files
+
+
+def _archive_members(archive_path):
+    """没有清单的压缩快照只能顺序读一遍 tar 头，成员内容会被解压但不保存"""
+    files = {}
+    with archive.open_tar(archive_path) as tar:
+        for member in tar:
+            if member.isfile():
+                files[member.name] = {'size': member.size, 'mtime_ns': int(member.mtime * 1_000_000_000)}
+    return files
+
+
+def select(files, patterns):
+    """按相对路径或 glob 选出文件，返回排序后的相对路径列表。
+
+    路径分隔符统一为 '/'；不含 '/' 的模式同时匹配文件名（例如 player.xml 匹配任意目录下的 player.xml），
+    目录路径匹配其下全部文件
+    """
+    selected = set()
+    for pattern in patterns:
+        pattern = pattern.replace('\\', '/').strip('/')
+        for rel_file in files:
+            if fnmatch.fnmatchcase(rel_file, pattern) or rel_file.startswith(pattern + '/'):
+                selected.add(rel_file)
+            elif '/' not in pattern and fnmatch.fnmatchcase(rel_file.rsplit('/', 1)[-1], pattern):
+                selected.add(rel_file)
+    return sorted(selected)
+
+
+def extract(backup_path, content_path, files, selected, dst, on_file=None):
+    """把 selected 中的文件按原相对路径写到 dst，返回写入的字节数。
+
+    每个文件先写临时文件再替换，dst 可以是正在使用的存档文件夹；on_file(相对路径) 在每个文件写完后调用
+    """
+    if archive.is_archive(backup_path):
+        return _extract_from_archive(backup_path, files, selected, dst, on_file)
+    kind = catalog.snapshot_kind(backup_path)
+    dst_dir = os.path.dirname(os.path.abspath(backup_path))
+    copy_function = functools.partial(store.copy_entry, dst_dir) if kind == 'store' else None
+    written_bytes = 0
+    for rel_file in selected:
+        entry = files[rel_file]
+        source = entry if kind == 'store' else os.path.join(content_path, *rel_file.split('/'))
+        diffrestore.replace_file(source, os.path.join(dst, *rel_file.split('/')), entry['mtime_ns'], copy_function)
+        written_bytes += entry['size']
+        if on_file is not None:
+            on_file(rel_file)
+    return written_bytes
+
+
+def _extract_from_archive(archive_path, files, selected, dst, on_file):
+    """压缩快照只能顺序读取，取齐所需的成员后就停止解压"""
+    remaining = set(selected)
+    written_bytes = 0
+    with archive.open_tar(archive_path) as tar:
+        for member in tar:
+            if not remaining:
+                break
+            if not member.isfile() or member.name not in remaining:
+                continue
+            remaining.discard(member.name)
+            target = archive.member_path(dst, member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + diffrestore.TMP_SUFFIX
+            with tar.extractfile(member) as fsrc, open(tmp_path, 'wb') as fdst:
+                shutil.copyfileobj(fsrc, fdst)
+            mtime_ns = files[member.name]['mtime_ns']
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(tmp_path, target)
+            written_bytes += member.size
+            if on_file is not None:
+                on_file(member.name)
+    if remaining:
+        raise FileNotFoundError(f"Not found in {archive_path}: {', '.join(sorted(remaining))}")
+    return written_bytes
+
+
+def _same(old, new):
+    """两个快照都有摘要时按摘要比较，否则按大小和修改时间比较"""
+    if 'hash' in old and 'hash' in new:
+        return old['hash'] == new['hash']
+    return (old['size'], old['mtime_ns']) == (new['size'], new['mtime_ns'])
+
+
+def diff(old_files, new_files):
+    """比较两个快照的文件表，返回 (新增, 删除, 修改) 三个排序后的相对路径列表"""
+    added = sorted(rel_file for rel_file in new_files if rel_file not in old_files)
+    removed = sorted(rel_file for rel_file in old_files if rel_file not in new_files)
+    changed = sorted(rel_file for rel_file, entry in new_files.items()
+                     if rel_file in old_files and not _same(old_files[rel_file], entry))
+    return added, removed, changed
@@ -0,0 +1,190 @@
+"""备份目录的持久化目录表：记录每个快照的时间、大小、文件数和状态，启动时不必逐个扫描"""
+import os
+import re
+import threading
+from datetime import datetime
+
+import archive
+import store
+
+CATALOG_FILENAME = 'catalog.json'
+CATALOG_VERSION = 1
+# 快照名形如 save00_20240101_120000
+SNAPSHOT_NAME_RE = re.compile(r'^(?P<source>.+)_(?P<timestamp>\d{8}_\d{6})$')
+# 多个存档配置共用一个备份目录时会在不同线程中同时修改目录表
+_lock = threading.RLock()
+
+
+def catalog_path(dst_dir):
+    return store.meta_path(dst_dir, CATALOG_FILENAME)
+
+
+def snapshot_kind(path):
+    """返回快照类型 folder/store/archive，不是快照时返回 None"""
+    name = os.path.basename(str(path))
+    if name.startswith('.'):
+        return None
+    if store.is_manifest(path):
+        return 'store'
+    if archive.is_archive(path):
+        return 'archive'
+    if os.path.isdir(path):
+        return 'folder'
+    return None
+
+
+def snapshot_name(path, kind):
+    if kind == 'store':
+        return store.manifest_name(path)
+    if kind == 'archive':
+        return archive.archive_name(path)
+    return os.path.basename(str(path))
+
+
+def snapshot_timestamp(name, path):
+    """优先从快照名解析时间，手动复制进来的文件夹名没有时间戳时退回到修改时间"""
+    match = SNAPSHOT_NAME_RE.match(name)
+    if match:
+        try:
+            return datetime.strptime(match.group('timestamp'), '%Y%m%d_%H%M%S').isoformat()
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.stat(path).st_mtime).isoformat(timespec='seconds')
+
+
+def make_entry(path, kind, files=None, status='ok'):
+    """生成一条目录记录；files 为快照时得到的文件索引，没有时从快照本身统计"""
+    name = snapshot_name(path, kind)
+    if files is None:
+        sidecar = store.sidecar_manifest_path(os.path.dirname(os.path.abspath(path)), name)
+        manifest = None
+        if kind != 'store' and os.path.exists(sidecar):
+            manifest = store.load_manifest(sidecar)
+        elif kind == 'store':
+            manifest = store.load_manifest(path)
+        if manifest is not None:
+            files = manifest['files']
+            if not manifest.get('consistent', True):
+                status = 'inconsistent'
+        elif kind == 'folder':
+            files = {}
+            for root, _, filenames in os.walk(path):
+                for file_name in filenames:
+                    file_path = os.path.join(root, file_name)
+                    files[store.relpath_key(file_path, path)] = {'size': os.path.getsize(file_path)}
+    entry = {
+        'name': name,
+        'path': os.path.basename(str(path)),
+        'kind': kind,
+        'timestamp': snapshot_timestamp(name, path),
+        'size': None,
+        'files': None,
+        'status': status,
+    }
+    if files is not None:
+        entry['files'] = len(files)
+        entry['size'] = sum(f['size'] for f in files.values())
+    if kind == 'archive':
+        # 压缩快照记录的是磁盘上实际占用的大小
+        entry['size'] = os.path.getsize(path)
+    return entry
+
+
+def _dir_mtime_ns(dst_dir):
+    return os.stat(dst_dir).st_mtime_ns
+
+
+def snapshot_source(name):
+    """快照名中时间戳之前的部分，即存档配置名；手动复制进来的没有时间戳的快照返回 None"""
+    match = SNAPSHOT_NAME_RE.match(name)
+    return match.group('source') if match else None
+
+
+def save(dst_dir, catalog):
+    """记录备份目录当前的修改时间，之后目录里有增删改名时就能发现目录表已过期"""
+    with _lock:
+        os.makedirs(store.meta_path(dst_dir), exist_ok=True)
+        catalog['dir_mtime_ns'] = _dir_mtime_ns(dst_dir)
+        store.write_json_atomic(catalog_path(dst_dir), catalog)
+
+
+def rebuild(dst_dir):
+    """扫描备份目录重新生成目录表"""
+    entries = {}
+    for entry_name in os.listdir(dst_dir):
+        path = os.path.join(dst_dir, entry_name)
+        kind = snapshot_kind(path)
+        if kind is None:
+            continue
+        try:
+            entries[entry_name] = make_entry(path, kind)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Skipping unreadable snapshot {path}: {e}")
+    catalog = {'version': CATALOG_VERSION, 'entries': entries}
+    save(dst_dir, catalog)
+    print(f"Rebuilt backup catalog with {len(entries)} snapshots.")
+    return catalog
+
+
+def load(dst_dir):
+    """读取目录表，缺失、损坏或备份目录在外部被改动过时返回 None"""
+    try:
+        catalog = store.read_json(catalog_path(dst_dir))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable backup catalog: {e}")
+        return None
+    if catalog.get('version') != CATALOG_VERSION:
+        return None
+    if catalog.get('dir_mtime_ns') != _dir_mtime_ns(dst_dir):
+        print("Backup directory changed outside the program, catalog is stale.")
+        return None
+    return catalog
+
+
+def load_or_rebuild(dst_dir):
+    catalog = load(dst_dir)
+    if catalog is None:
+        catalog = rebuild(dst_dir)
+    return catalog
+
+
+def add(dst_dir, catalog, path, files=None, status='ok'):
+    """新快照完成后增量更新目录表"""
+    kind = snapshot_kind(path)
+    entry = make_entry(path, kind, files, status)
+    with _lock:
+        catalog['entries'][os.path.basename(str(path))] = entry
+        save(dst_dir, catalog)
+
+
+def remove(dst_dir, catalog, path):
+    with _lock:
+        catalog['entries'].pop(os.path.basename(str(path)), None)
+        save(dst_dir, catalog)
+
+
+def set_status(dst_dir, catalog, path, status):
+    """更新快照状态，例如校验失败时标记为 corrupt"""
+    with _lock:
+        entry = catalog['entries'].get(os.path.basename(str(path)))
+        if entry is not None and entry['status'] != status:
+            entry['status'] = status
+            save(dst_dir, catalog)
+
+
+def sorted_entries(catalog, owns=None):
+    """按时间从新到旧排序，时间相同时按名称排序，保证 1-9 号槽位的顺序固定。
+
+    owns(source) 用于只取某个存档配置的快照，source 为 snapshot_source() 的结果
+    """
+    with _lock:
+        entries = list(catalog['entries'].values())
+    if owns is not None:
+        entries = [e for e in entries if owns(snapshot_source(e['name']))]
+    return sorted(entries, key=lambda e: (e['timestamp'], e['path']), reverse=True)
+
+
+def recent_paths(dst_dir, catalog, count=9, owns=None):
+    return [os.path.join(dst_dir, e['path']) for e in sorted_entries(catalog, owns)[:count]]
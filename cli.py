@@ -0,0 +1,253 @@
+"""命令行入口：不需要热键程序即可备份、列出、恢复、校验和清理存档
+
+用法:
+    python cli.py backup
+    python cli.py list
+    python cli.py restore N
+    python cli.py files N [PATTERN ...]
+    python cli.py extract N PATTERN ... [--to DIR]
+    python cli.py diff OLD NEW
+    python cli.py verify [N]
+    python cli.py prune
+    python cli.py stats
+    python cli.py sync
+    python cli.py pull [N]
+    python cli.py bench
+    python cli.py --profile save01 list
+
+配置了多个存档（profiles）时，--profile 选择操作哪一个，默认为顶层 src_path 对应的存档。
+一次性命令不会导入 keyboard；psutil 只在 restore 检查游戏进程时导入，tqdm 只在显示恢复进度时导入。
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import copyengine
+import oplog
+import progress
+import browse
+import savemanager
+
+
+def cmd_backup(manager, args):
+    path, consistent = manager.snapshot(op=manager.operation('backup', trigger='cli'))
+    return 0 if consistent else 1
+
+
+def format_size(size):
+    if size is None:
+        return '?'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def cmd_list(manager, args):
+    entries = manager.list()
+    if not entries:
+        print("No backups found.")
+        return 0
+    print(f"{'#':>3}  {'name':<28}{'kind':<9}{'time':<21}{'size':>10}{'files':>8}  status")
+    for i, entry in enumerate(entries, 1):
+        files = entry['files'] if entry['files'] is not None else '?'
+        print(f"{i:>3}  {entry['name']:<28}{entry['kind']:<9}{entry['timestamp']:<21}"
+              f"{format_size(entry['size']):>10}{files:>8}  {entry['status']}")
+    return 0
+
+
+def cmd_restore(manager, args):
+    manager.restore(args.index, progress=None if args.quiet else progress.TqdmProgress(),
+                    op=manager.operation('restore', trigger='cli'))
+    return 0
+
+
+def cmd_files(manager, args):
+    """按清单列出备份中的文件，不遍历快照目录"""
+    files = manager.contents(args.index)
+    selected = browse.select(files, args.patterns) if args.patterns else sorted(files)
+    for rel_file in selected:
+        entry = files[rel_file]
+        print(f"{format_size(entry['size']):>10}  {entry.get('hash', '')[:12]:<12}  {rel_file}")
+    print(f"{len(selected)} files, {format_size(sum(files[rel_file]['size'] for rel_file in selected))}")
+    return 0
+
+
+def cmd_extract(manager, args):
+    manager.extract(args.index, args.patterns, dst=args.to, op=manager.operation('extract', trigger='cli'))
+    return 0
+
+
+def cmd_diff(manager, args):
+    """按摘要列出两个备份之间新增（A）、删除（D）和修改（M）的文件"""
+    added, removed, changed = manager.diff(args.old, args.new)
+    for flag, rel_files in (('A', added), ('D', removed), ('M', changed)):
+        for rel_file in rel_files:
+            print(f"{flag} {rel_file}")
+    print(f"{len(added)} added, {len(removed)} removed, {len(changed)} changed.")
+    return 0
+
+
+def cmd_verify(manager, args):
+    if args.index is not None:
+        paths = [manager.backup_path(args.index)]
+    else:
+        paths = [os.path.join(manager.dst_dir, entry['path']) for entry in manager.list()]
+    failed = [path for path in paths if not manager.verify(path)]
+    print(f"Verified {len(paths)} backups, {len(failed)} failed.")
+    return 1 if failed else 0
+
+
+def cmd_prune(manager, args):
+    manager.prune()
+    return 0
+
+
+def cmd_stats(manager, args):
+    """按操作和阶段汇总操作日志中成功记录的耗时，以及恢复缓存的命中与淘汰"""
+    records = list(manager.oplog.records())
+    summary = oplog.stats(records)
+    if not summary:
+        print("No operations logged yet.")
+        return 0
+    print(f"{'operation':<10}{'phase':<17}{'count':>6}{'p50 s':>10}{'p95 s':>10}")
+    for (op, phase), (count, p50, p95) in sorted(summary.items(), key=lambda item: (item[0][0], item[0][1] != 'total')):
+        print(f"{op:<10}{phase:<17}{count:>6}{p50:>10.3f}{p95:>10.3f}")
+    cache = oplog.cache_stats(records)
+    if cache['restores']:
+        print(f"Restore cache over {cache['restores']} restores: {cache['hits']} hits ({format_size(cache['hit_bytes'])}), "
+              f"{cache['misses']} misses, {cache['evictions']} evictions ({format_size(cache['evicted_bytes'])})")
+    return 0
+
+
+def cmd_sync(manager, args):
+    """立即把备份目录同步到 config.json 中的每个存储后端"""
+    replicator = manager.shared.replicator
+    if replicator is None:
+        print("No backends configured.")
+        return 1
+    # 配置了后端时 SaveManager 已经导入了 backends 模块
+    import backends
+    try:
+        for backend in replicator.backends:
+            replicator.sync(backend)
+    except (backends.BackendError, ConnectionError) as e:
+        print(f"Backend error: {e}")
+        return 1
+    return 0
+
+
+def cmd_pull(manager, args):
+    """从第 N 个存储后端取回本地缺少的备份，例如备份磁盘损坏之后"""
+    replicator = manager.shared.replicator
+    storage_backends = replicator.backends if replicator is not None else []
+    if not 1 <= args.backend <= len(storage_backends):
+        print(f"Invalid backend: {args.backend}. {len(storage_backends)} backends configured.")
+        return 1
+    import backends
+    import replicate
+    try:
+        replicate.pull(storage_backends[args.backend - 1], manager.dst_dir, manager.copy_workers)
+    except (backends.BackendError, ConnectionError) as e:
+        print(f"Backend error: {e}")
+        return 1
+    manager.shared.catalog = None
+    manager.load()
+    return 0
+
+
+def cmd_bench(manager, args):
+    """把当前存档复制到临时目录，在副本上计时一次快照、校验和恢复，真实的存档和备份目录不受影响"""
+    with tempfile.TemporaryDirectory() as tmp:
+        save_copy = os.path.join(tmp, os.path.basename(os.path.normpath(manager.src_path)))
+        start = time.perf_counter()
+        copyengine.copytree(manager.src_path, save_copy, manager.copy_workers)
+        print(f"{'copy save':<16}{time.perf_counter() - start:8.3f} s")
+
+        manager = savemanager.SaveManager(dict(manager.config, src_path=save_copy,
+                                               dst_dir=os.path.join(tmp, 'backups')))
+        manager.is_game_running = lambda: False
+        manager.load()
+        for label, func in (('snapshot', manager.snapshot),
+                            ('verify', lambda: manager.verify(manager.backup_path(1))),
+                            ('restore', lambda: manager.restore(1))):
+            start = time.perf_counter()
+            func()
+            print(f"{label:<16}{time.perf_counter() - start:8.3f} s")
+    return 0
+
+
+COMMANDS = {
+    'backup': cmd_backup,
+    'list': cmd_list,
+    'restore': cmd_restore,
+    'files': cmd_files,
+    'extract': cmd_extract,
+    'diff': cmd_diff,
+    'verify': cmd_verify,
+    'prune': cmd_prune,
+    'stats': cmd_stats,
+    'sync': cmd_sync,
+    'pull': cmd_pull,
+    'bench': cmd_bench,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Back up and restore Noita saves without the hotkey daemon.")
+    parser.add_argument('--config', help="path to config.json (default: config.json next to the program)")
+    parser.add_argument('--profile', help="which save profile to use (default: the top-level src_path)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backup', help="take a snapshot of the save folder")
+    subparsers.add_parser('list', help="list backups, newest first")
+    restore_parser = subparsers.add_parser('restore', help="restore backup N from the list")
+    restore_parser.add_argument('index', type=int)
+    restore_parser.add_argument('--quiet', action='store_true', help="no progress bar")
+    files_parser = subparsers.add_parser('files', help="list the files in backup N from its manifest")
+    files_parser.add_argument('index', type=int)
+    files_parser.add_argument('patterns', nargs='*', help="only list paths or globs like player.xml, world/*")
+    extract_parser = subparsers.add_parser('extract', help="copy matching files out of backup N")
+    extract_parser.add_argument('index', type=int)
+    extract_parser.add_argument('patterns', nargs='+', help="paths or globs like player.xml, world/*")
+    extract_parser.add_argument('--to', help="write into this folder instead of the live save")
+    diff_parser = subparsers.add_parser('diff', help="list files that differ between backups OLD and NEW")
+    diff_parser.add_argument('old', type=int)
+    diff_parser.add_argument('new', type=int)
+    verify_parser = subparsers.add_parser('verify', help="verify backup N, or every backup")
+    verify_parser.add_argument('index', type=int, nargs='?')
+    subparsers.add_parser('prune', help="apply the retention policy now")
+    subparsers.add_parser('stats', help="p50/p95 time per phase of past backups and restores")
+    subparsers.add_parser('sync', help="upload new backups to the configured backends now")
+    pull_parser = subparsers.add_parser('pull', help="download backups missing locally from backend N")
+    pull_parser.add_argument('backend', type=int, nargs='?', default=1)
+    subparsers.add_parser('bench', help="time snapshot/verify/restore on a temporary copy of the save")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        manager = savemanager.find_profile(savemanager.load_profiles(savemanager.load_config(args.config)),
+                                           args.profile)
+        manager.load()
+        return COMMANDS[args.command](manager, args)
+    except savemanager.ConfigError as e:
+        print(f"Error: {e}")
+    except (IndexError, savemanager.RestoreAborted) as e:
+        print(e)
+    except FileExistsError as e:
+        print(f"Destination {e} already exists.")
+    except FileNotFoundError as e:
+        print(e)
+    except PermissionError as e:
+        print(f"Permission denied: {e}")
+    except shutil.Error as e:
+        savemanager.print_copy_errors(e)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""多线程复制引擎：先建好目录骨架，再把逐个文件的复制分发到线程池"""
+import os
+import sys
+import errno
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+# Linux 的 FICLONE ioctl：btrfs/xfs 等文件系统上只复制元数据，共享数据块（写时复制）
+FICLONE = 0x40049409
+# 这些错误表示当前文件系统或内核不支持该方式，换下一种即可
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EPERM,
+                      getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL),
+                      getattr(errno, 'ENOTTY', errno.EINVAL)}
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _no_progress(name, src, size, remaining):
+    """系统调用返回 0 时：第一次调用就是 0 说明文件系统不支持（有的文件系统不报错），让探测换下一种方式；
+    复制到一半才返回 0 时交给 _check_size 报告"""
+    if remaining == size:
+        raise OSError(errno.EOPNOTSUPP, f"{name} copied nothing from {src}")
+
+
+def _check_size(fdst, src, size):
+    """复制结束后核对目标大小，避免被截断的文件被当作完整的副本"""
+    written = os.fstat(fdst.fileno()).st_size
+    if written != size:
+        raise OSError(errno.EIO, f"Short copy of {src}: {written} of {size} bytes written")
+
+
+def _copy_file_range(src, dst):
+    """内核内复制，不经过用户态缓冲区；部分文件系统上也会自动使用 reflink"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        remaining = size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                _no_progress('copy_file_range', src, size, remaining)
+                break
+            remaining -= copied
+        _check_size(fdst, src, size)
+
+
+def _sendfile(src, dst):
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        remaining = size
+        offset = 0
+        while remaining > 0:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, remaining)
+            if sent == 0:
+                _no_progress('sendfile', src, size, remaining)
+                break
+            offset += sent
+            remaining -= sent
+        _check_size(fdst, src, size)
+
+
+def _copyfile(src, dst):
+    # Python 3.12+ 在 Windows 上由 CopyFile2 完成，ReFS/开发驱动器上会自动使用块克隆
+    shutil.copyfile(src, dst)
+
+
+# 按开销从低到高排列，不可用的方式会被跳过
+STRATEGIES = {'copy': _copyfile}
+if sys.platform.startswith('linux'):
+    STRATEGIES = {'reflink': _reflink, 'copy_file_range': _copy_file_range, 'sendfile': _sendfile, 'copy': _copyfile}
+    if not hasattr(os, 'copy_file_range'):
+        del STRATEGIES['copy_file_range']
+
+# (源设备, 目标设备) -> 已确认可用的方式，避免每个文件都重新探测
+_chosen_strategies = {}
+# 由 set_strategy() 固定的方式，None 表示自动选择
+_pinned_strategy = None
+
+
+def set_strategy(name):
+    """固定所有复制使用的方式（用于基准测试），传入 None 恢复自动选择"""
+    global _pinned_strategy
+    if name is not None and name not in STRATEGIES:
+        raise ValueError(f"Unknown copy strategy: {name}")
+    _pinned_strategy = name
+
+
+def strategy_for(src, dst):
+    """返回该源/目标设备组合已选定的复制方式，尚未探测过时返回 None"""
+    if _pinned_strategy is not None:
+        return _pinned_strategy
+    return _chosen_strategies.get(_device_pair(src, dst))
+
+
+def _device_pair(src, dst):
+    return os.stat(src).st_dev, os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+
+
+def fast_copy(src, dst, metadata=True, strategy=None):
+    """用当前文件系统上开销最低的方式复制文件，metadata 为 True 时像 copy2 一样保留时间戳。
+
+    每个设备组合第一次复制时依次尝试 STRATEGIES，选中的方式会打印出来并缓存；
+    strategy 可以强制指定某种方式（用于基准测试）
+    """
+    if strategy is None:
+        strategy = _pinned_strategy
+    if strategy is not None:
+        STRATEGIES[strategy](src, dst)
+    else:
+        pair = _device_pair(src, dst)
+        chosen = _chosen_strategies.get(pair)
+        if chosen is not None:
+            STRATEGIES[chosen](src, dst)
+        else:
+            for name, func in STRATEGIES.items():
+                try:
+                    func(src, dst)
+                except OSError as e:
+                    if name == 'copy' or e.errno not in UNSUPPORTED_ERRNOS:
+                        raise
+                    continue
+                if pair not in _chosen_strategies:
+                    _chosen_strategies[pair] = name
+                    print(f"Copy strategy from {os.path.dirname(os.path.abspath(src))} to "
+                          f"{os.path.dirname(os.path.abspath(dst))}: {name}")
+                break
+    if metadata:
+        shutil.copystat(src, dst)
+    return dst
+
+
+def run_parallel(func, items, workers=DEFAULT_WORKERS):
+    """对每个 (src, dst, ...) 元组并行调用 func(*item)，按输入顺序返回结果。
+
+    单个文件失败不会中断其余文件，所有失败最后汇总为一个 shutil.Error 抛出，
+    错误列表格式与 shutil.copytree 相同：[(src, dst, 原因), ...]
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+
+    def run_one(i):
+        try:
+            results[i] = func(*items[i])
+        except Exception as e:
+            errors.append((items[i][0], items[i][1], str(e)))
+
+    if workers <= 1 or len(items) <= 1:
+        for i in range(len(items)):
+            run_one(i)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # list() 等待全部完成；run_one 自己捕获异常，不会提前中断
+            list(executor.map(run_one, range(len(items))))
+
+    if errors:
+        raise shutil.Error(errors)
+    return results
+
+
+def scan_tree(src, dst):
+    """用一次 scandir 遍历列出 src 下所有文件和目录，返回 ([(源文件, 目标文件, 大小)], [(源目录, 目标目录)])。
+
+    大小直接取自目录项（Windows 上不需要额外的系统调用），恢复时用它计算总字节数，不必再遍历一遍
+    """
+    files = []
+    dirs = []
+    stack = [(src, dst)]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                target = os.path.join(dst_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append((entry.path, target))
+                    stack.append((entry.path, target))
+                else:
+                    files.append((entry.path, target, entry.stat().st_size))
+    return files, dirs
+
+
+def copytree(src, dst, workers=DEFAULT_WORKERS, copy_function=fast_copy, tree=None):
+    """与 shutil.copytree(src, dst, copy_function=...) 效果相同的并行版本。
+
+    tree 为 scan_tree(src, dst) 的结果，调用方已经遍历过时传入，避免重复遍历
+    """
+    files, dirs = tree if tree is not None else scan_tree(src, dst)
+    os.makedirs(dst)
+    for _, target_dir in dirs:
+        os.makedirs(target_dir, exist_ok=True)
+
+    run_parallel(copy_function, [(src_file, dst_file) for src_file, dst_file, _ in files], workers)
+
+    # 文件写完后再同步目录的时间戳，否则写入文件会把它们改掉
+    for src_dir, dst_dir in reversed(dirs):
+        shutil.copystat(src_dir, dst_dir)
+    shutil.copystat(src, dst)
+    return dst
@@ -0,0 +1,181 @@
+"""差异恢复：只改写与快照不同的文件，删除快照中没有的文件，相同的文件保持不动
+
+与整体替换不同，差异恢复是逐个文件原地进行的：每个文件先写临时文件再替换，
+但中途失败时存档可能处于部分恢复的状态。
+"""
+import os
+import shutil
+import functools
+
+import archive
+import catalog
+import copyengine
+import integrity
+import store
+
+TMP_SUFFIX = '.restoring'
+
+
+def load_snapshot_files(backup_path, content_path):
+    """优先使用快照清单；没有清单的旧文件夹快照只能逐个读取元数据"""
+    manifest_path = integrity.manifest_for(backup_path)
+    if manifest_path is not None:
+        manifest = store.load_manifest(manifest_path)
+        return manifest['files'], set(manifest['dirs'])
+    files = {}
+    for rel_file, (size, mtime_ns) in store.scan_tree(content_path).items():
+        files[rel_file] = {'size': size, 'mtime_ns': mtime_ns}
+    return files, set()
+
+
+def plan(files, dst, check_hash=False):
+    """按 (size, mtime_ns) 找出需要写入和删除的文件，check_hash 时对元数据相同的文件再比对摘要"""
+    live = store.scan_tree(dst)
+    to_write = []
+    for rel_file, entry in files.items():
+        if live.get(rel_file) != (entry['size'], entry['mtime_ns']):
+            to_write.append(rel_file)
+        elif check_hash and 'hash' in entry:
+            if store.hash_file(os.path.join(dst, *rel_file.split('/'))) != entry['hash']:
+                to_write.append(rel_file)
+    to_delete = [rel_file for rel_file in live if rel_file not in files]
+    return to_write, to_delete
+
+
+def replace_file(source, target, mtime_ns, copy_function=None):
+    """先写到同目录的临时文件再替换，目标文件任何时刻都是完整的。
+
+    copy_function(source, 临时文件) 默认为不复制元数据的 fast_copy，对象库快照用它按清单条目写出文件
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = target + TMP_SUFFIX
+    if copy_function is None:
+        copyengine.fast_copy(source, tmp_path, metadata=False)
+    else:
+        copy_function(source, tmp_path)
+    os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp_path, target)
+
+
+def _remove_extra_dirs(dst, files, dirs):
+    """删除快照中不存在且已经空了的目录"""
+    keep = set(dirs)
+    for rel_file in files:
+        parts = rel_file.split('/')[:-1]
+        for i in range(1, len(parts) + 1):
+            keep.add('/'.join(parts[:i]))
+    for root, _, _ in os.walk(dst, topdown=False):
+        if root == dst:
+            continue
+        if store.relpath_key(root, dst) not in keep and not os.listdir(root):
+            os.rmdir(root)
+
+
+def _delete_files(dst, to_delete):
+    for rel_file in to_delete:
+        try:
+            os.remove(os.path.join(dst, *rel_file.split('/')))
+        except FileNotFoundError:
+            pass
+
+
+def diff_restore(backup_path, content_path, dst, check_hash=False, workers=copyengine.DEFAULT_WORKERS,
+                 on_plan=None, on_file=None):
+    """把快照差异恢复到 dst，返回 (写入的文件数, 写入的字节数, 删除的文件数, 未改动的文件数)。
+
+    content_path 为文件夹快照中实际存放存档内容的目录；on_plan(总字节数, 总文件数) 在开始写入前调用，
+    on_file(字节数) 在每个文件写完后调用（可能来自多个线程）
+    """
+    if archive.is_archive(backup_path):
+        return _diff_restore_archive(backup_path, dst, check_hash, on_plan, on_file)
+
+    files, dirs = load_snapshot_files(backup_path, content_path)
+    os.makedirs(dst, exist_ok=True)
+    to_write, to_delete = plan(files, dst, check_hash)
+    if on_plan is not None:
+        on_plan(sum(files[rel_file]['size'] for rel_file in to_write), len(to_write))
+
+    kind = catalog.snapshot_kind(backup_path)
+    dst_dir = os.path.dirname(os.path.abspath(backup_path))
+
+    copy_function = functools.partial(store.copy_entry, dst_dir) if kind == 'store' else None
+
+    def write_one(source, target, rel_file):
+        entry = files[rel_file]
+        replace_file(source, target, entry['mtime_ns'], copy_function)
+        if on_file is not None:
+            on_file(entry['size'])
+
+    tasks = []
+    for rel_file in to_write:
+        if kind == 'store':
+            source = files[rel_file]
+        else:
+            source = os.path.join(content_path, *rel_file.split('/'))
+        tasks.append((source, os.path.join(dst, *rel_file.split('/')), rel_file))
+    copyengine.run_parallel(write_one, tasks, workers)
+
+    _delete_files(dst, to_delete)
+    for rel_dir in dirs:
+        os.makedirs(os.path.join(dst, *rel_dir.split('/')), exist_ok=True)
+    _remove_extra_dirs(dst, files, dirs)
+    written_bytes = sum(files[rel_file]['size'] for rel_file in to_write)
+    return len(to_write), written_bytes, len(to_delete), len(files) - len(to_write)
+
+
+def _diff_restore_archive(backup_path, dst, check_hash, on_plan, on_file):
+    """压缩快照只能顺序读取：仍要解压整个流，但只把有差异的成员写入磁盘"""
+    manifest_path = integrity.manifest_for(backup_path)
+    files = store.load_manifest(manifest_path)['files'] if manifest_path is not None else None
+    os.makedirs(dst, exist_ok=True)
+    if files is not None:
+        to_write, to_delete = plan(files, dst, check_hash)
+        to_write = set(to_write)
+        if on_plan is not None:
+            on_plan(sum(files[rel_file]['size'] for rel_file in to_write), len(to_write))
+    else:
+        # 没有清单时无法事先比较，只能边读边按成员的大小和时间判断
+        live = store.scan_tree(dst)
+        if on_plan is not None:
+            on_plan(None, None)
+
+    seen = set()
+    dirs = set()
+    written_files = 0
+    written_bytes = 0
+    with archive.open_tar(backup_path) as tar:
+        for member in tar:
+            if member.isdir():
+                dirs.add(member.name)
+                continue
+            if not member.isfile():
+                continue
+            seen.add(member.name)
+            if files is not None:
+                if member.name not in to_write:
+                    continue
+                mtime_ns = files[member.name]['mtime_ns']
+            else:
+                mtime_ns = int(member.mtime * 1_000_000_000)
+                live_stat = live.get(member.name)
+                if live_stat is not None and live_stat[0] == member.size \
+                        and abs(live_stat[1] - mtime_ns) < 1_000_000_000:
+                    continue
+            target = archive.member_path(dst, member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + TMP_SUFFIX
+            with tar.extractfile(member) as fsrc, open(tmp_path, 'wb') as fdst:
+                shutil.copyfileobj(fsrc, fdst)
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(tmp_path, target)
+            written_files += 1
+            written_bytes += member.size
+            if on_file is not None:
+                on_file(member.size)
+
+    if files is None:
+        files = {rel_file: None for rel_file in seen}
+        to_delete = [rel_file for rel_file in live if rel_file not in seen]
+    _delete_files(dst, to_delete)
+    _remove_extra_dirs(dst, files, dirs)
+    return written_files, written_bytes, len(to_delete), len(files) - written_files
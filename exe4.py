@@ -1,57 +1,41 @@
 import os
 import sys
+import time
 import shutil
+import argparse
 import keyboard
-from datetime import datetime
-import json
-from pathlib import Path
-import winsound
-import psutil
 
-from tqdm import tqdm
-import shutil
-import os
-from pathlib import Path
-
-
-def copy_with_progress(src, dst):
-    """带进度条的文件复制函数"""
-    try:
-        shutil.copy2(src, dst)
-        pbar.update(1)  # 更新进度条
-    except Exception as e:
-        print(f"Failed to copy {src}: {e}")
-        raise
-
-
-def is_noita_running():
-    """Check if Noita.exe is running based on the path specified in the config."""
+import jobs
+import procwatch
+import progress
+import savemanager
+import watcher
 
-    for proc in psutil.process_iter(['pid', 'name', 'exe']):
-        try:
-            # Check if process exe path matches the given exe path
-            if proc.info['exe'] and proc.info['exe'].lower() == noita_path.lower():
-                return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return False
 
 def play_sound():
     """播放正常提示音"""
     if ALERT_ON:
         frequency = 2500  # 音频频率 (Hz)
         duration = 300   # 声音持续时间 (ms)
+        import winsound  # 第一次提示时才导入
         winsound.Beep(frequency, duration)  # 发出蜂鸣声
 
 def play_alert_sound(twice=False):
     """发出两次蜂鸣声作为警告"""
     if ALERT_ON:
+        import winsound
         for _ in range(2 if twice else 1):
             winsound.Beep(2500, 500)  # 发出短促的蜂鸣声
             if twice:
                 winsound.Beep(2500, 500)  # 再次发出短促的蜂鸣声，仅当twice为True时
-# 全局变量，用于存储最近9次复制的目标路径
-recent_backups = []
+# 快照、恢复和清理都由 SaveManager 完成，本文件只负责热键、提示音和后台线程
+# 每个存档配置（profile）一个 SaveManager，它们共用同一个备份目录
+managers = []
+# 同一个存档的备份和恢复交给它自己的后台线程串行执行，不同存档之间可以同时进行
+job_workers = {}
+auto_snapshotters = {}
+# 按 Noita.exe 路径区分的进程监视器，多个存档指向同一个游戏时共用
+noita_watchers = {}
 
 
 def verify_noita_path(config):
@@ -88,201 +72,177 @@ def check_files_open(directory):
                 return True
     return False
 
-def resource_path(relative_path):
-    """ Get absolute path to resource, works for dev and for PyInstaller """
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-
-    return os.path.join(base_path, relative_path)
-
-
-# 加载配置文件
-config_file_path = resource_path('config.json')
-try:
-    with open(config_file_path, 'r', encoding='utf-8') as config_file:
-        config = json.load(config_file)
-except FileNotFoundError:
-    print(f"Error: Config file not found at {config_file_path}")
-    sys.exit(1)
-except json.JSONDecodeError as e:
-    print(f"Error: Failed to parse config file: {e}")
-    sys.exit(1)
-
-# 使用 os.path.expandvars 扩展环境变量
-SRC_PATH = os.path.expandvars(config.get('src_path', ''))
-DST_DIR = os.path.expandvars(config.get('dst_dir', ''))
-COPY_HOTKEY = config.get('copy_hotkey', 'ctrl+shift+x')
-EXIT_HOTKEY = config.get('exit_hotkey', 'ctrl+shift+q')
-RESTORE_HOTKEY_BASE = config.get('restore_hotkey', 'shift+v')
-noita_path = os.path.expandvars(config.get('noita_path', 'D:\\steam\\steamapps\\common\\Noita\\noita.exe'))
-ALERT_ON = config.get('alert', 'on').lower() == 'on'  # 默认开启警报
-if not SRC_PATH or not DST_DIR:
-    print("Error: Source path or destination directory is not specified in the config file.")
-    sys.exit(1)
-
-
-def ensure_backup_directory_exists():
-    """确保备份文件夹存在"""
-    if not os.path.exists(DST_DIR):
-        os.makedirs(DST_DIR)
-        print(f"Backup directory created at {DST_DIR}")
-
-
-def load_existing_backups():
-    """加载现有的备份文件夹，并按时间排序填入 recent_backups 中"""
-    global recent_backups
-    backup_folders = [f for f in Path(DST_DIR).iterdir() if f.is_dir()]
-    backup_folders.sort(key=lambda p: p.stat().st_mtime, reverse=True)  # 按修改时间降序排序
-
-    recent_backups = [str(folder) for folder in backup_folders[:9]]
-    print(f"Loaded {len(recent_backups)} existing backups.")
-
-
-def copy_folder_with_timestamp(src, dst_dir):
-    """将文件夹从 src 复制到 dst_dir，并用时间戳重命名"""
-    global recent_backups
+
+def load_settings(config_path=None):
+    """加载配置文件，出错时报错退出"""
+    global config, COPY_HOTKEY, EXIT_HOTKEY, RESTORE_HOTKEY_BASE, ALERT_ON, PROCESS_RESCAN_INTERVAL
+    global AUTO_SNAPSHOT, AUTO_SNAPSHOT_QUIET_SECONDS, AUTO_SNAPSHOT_POLL_INTERVAL
     try:
-        print(f"Checking source path: {src}")
-        if not os.path.exists(src) or not os.access(src, os.R_OK):
-            print(f"Error: No read access to {src}")
-            return
-
-        print(f"Checking destination directory: {dst_dir}")
-        if not os.path.isdir(dst_dir) or not os.access(dst_dir, os.W_OK):
-            print(f"Error: No write access to {dst_dir}")
-            return
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        foldername = os.path.basename(os.path.normpath(src))
-        dst = os.path.join(dst_dir, f'{foldername}_{timestamp}')
-
-        print(f"Copying folder from {src} to {dst}")
-        shutil.copytree(src, dst)
-        print(f"Folder copied successfully to {dst}")
-        play_sound()
-        # 更新最近一次复制的目标路径，并保持最多9个备份
-        recent_backups.insert(0, dst)
-        recent_backups = recent_backups[:9]
+        config = savemanager.load_config(config_path)
+    except savemanager.ConfigError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    except FileExistsError:
-        print(f"Destination folder {dst} already exists.")
+    COPY_HOTKEY = config.get('copy_hotkey', 'ctrl+shift+x')
+    EXIT_HOTKEY = config.get('exit_hotkey', 'ctrl+shift+q')
+    RESTORE_HOTKEY_BASE = config.get('restore_hotkey', 'shift+v')
+    ALERT_ON = config.get('alert', 'on').lower() == 'on'  # 默认开启警报
+    # 后台完整扫描进程列表的间隔（秒）
+    PROCESS_RESCAN_INTERVAL = float(config.get('process_rescan_interval', procwatch.DEFAULT_RESCAN_INTERVAL))
+    # 自动快照：存档文件夹停止写入 auto_snapshot_quiet_seconds 秒后自动备份；无法使用系统通知时按 poll_interval 轮询
+    AUTO_SNAPSHOT = config.get('auto_snapshot', False)
+    AUTO_SNAPSHOT_QUIET_SECONDS = float(config.get('auto_snapshot_quiet_seconds', watcher.DEFAULT_QUIET_SECONDS))
+    AUTO_SNAPSHOT_POLL_INTERVAL = float(config.get('auto_snapshot_poll_interval', watcher.DEFAULT_POLL_INTERVAL))
+
+
+def on_save_folder_quiet(manager):
+    """存档文件夹的一批写入结束后自动备份，与热键备份共用合并逻辑"""
+    print(f"Save folder {manager.name} quiet for {auto_snapshotters[manager.name].quiet_seconds:g}s, "
+          f"taking automatic snapshot.")
+    job_workers[manager.name].submit(backup_job, manager, manager.operation('backup', trigger='auto'),
+                                     coalesce_key='backup')
+
+
+def load_job(manager):
+    """后台线程中执行的启动任务：放回上次中断替换的存档、读取目录表，之后才开始清理、预暂存和自动快照。
+
+    作为每个存档的第一个任务入队，启动期间按下的热键会排在它之后执行
+    """
+    manager.recover_swap()
+    manager.load()
+    manager.pruner.start()
+    manager.prestager.start()
+    if manager.config.get('auto_snapshot', AUTO_SNAPSHOT):
+        auto_snapshotters[manager.name].start()
+        print(f"Automatic snapshots enabled for {manager.src_path}.")
+
+
+def backup_job(manager, op):
+    """后台线程中执行的备份任务，完成后通知清理线程按保留策略删除旧备份，更新预暂存的槽位副本并同步到存储后端"""
+    try:
+        _, consistent = manager.snapshot(op=op)
+        if consistent:
+            play_sound()
+        else:
+            play_alert_sound()
+    except FileExistsError as e:
+        print(f"Destination folder {e} already exists.")
     except PermissionError as e:
         print(f"Permission denied when trying to copy the folder: {e}")
+    except shutil.Error as e:
+        savemanager.print_copy_errors(e)
     except Exception as e:
         print(f"An error occurred while copying the folder: {e}")
+    manager.pruner.request()
+    manager.prestager.request()
+    if manager.shared.replicator is not None:
+        manager.shared.replicator.request()
 
-def adjust_restore_path(backup_path):
-    """调整恢复路径以指向 'save00' 文件夹（如果存在）"""
-    save00_path = os.path.join(backup_path, 'save00')
-    if os.path.isdir(save00_path):
-        print(f"'save00' folder found within the backup. Adjusting restore path to: {save00_path}")
-        return save00_path
-    else:
-        print(" Using original backup path.")
-        return backup_path
-
-def copy_with_progress(src, dst):
-    """带进度条的文件复制函数"""
-    try:
-        shutil.copy2(src, dst)
-        pbar.update(1)  # 更新进度条
-    except Exception as e:
-        print(f"Failed to copy {src}: {e}")
-        raise
-
-
-def shorten_path(path_str):
-    """缩短路径，移除直到 LocalLow 的部分并用 ... 替换"""
-    local_low_index = path_str.find(r'LocalLow')
-    if local_low_index != -1:
-        return '...' + path_str[local_low_index + len('LocalLow'):]
-    else:
-        return path_str
-
-
-def restore_backup(index):
-    """将指定编号的备份文件夹复制回源文件夹的上一级目录，并替换同名文件"""
-    global pbar  # 确保进度条可以在 copy_with_progress 中访问
-
-    if index < 1 or index > len(recent_backups):
-        print(f"Invalid backup index: {index}. Available backups are from 1 to {len(recent_backups)}.")
-        return
-
-    src_backup = recent_backups[index - 1]
-    adjusted_src_backup = adjust_restore_path(src_backup)
-
-    # 检查 Noita 文件是否被占用
-    if is_noita_running():
-        print("Some files in the Noita directory appear to be in use. Aborting restore.")
-        play_alert_sound(twice=True)
-        return
-
-    parent_dir = str(Path(SRC_PATH).parent)
-    foldername = os.path.basename(os.path.normpath(SRC_PATH))
-    dst_path = os.path.join(parent_dir, foldername)
 
+def restore_job(manager, index, op):
+    """后台线程中执行的恢复任务，期间不会进行清理"""
     try:
-        print(f"Restoring from {shorten_path(adjusted_src_backup)} to {shorten_path(dst_path)}")
-
-        # 删除目标文件夹（如果有）
-        shutil.rmtree(dst_path, ignore_errors=True)
-
-        # 计算总文件数以初始化进度条
-        total_files = sum([len(files) for _, _, files in os.walk(adjusted_src_backup)])
-        pbar = tqdm(total=total_files, unit='file', desc='Restoring Backup')
-
-        # 使用自定义的复制函数和进度条进行复制
-        shutil.copytree(adjusted_src_backup, dst_path, copy_function=copy_with_progress)
-
-        pbar.close()  # 关闭进度条
-        print(f"Backup restored successfully to {shorten_path(dst_path)}")
+        manager.restore(index, progress=progress.TqdmProgress(), op=op)
         play_sound()
+    except IndexError as e:
+        print(e)
+    except savemanager.RestoreAborted as e:
+        print(e)
+        play_alert_sound(twice=True)
+    except shutil.Error as e:
+        savemanager.print_copy_errors(e)
     except Exception as e:
         print(f"An error occurred while restoring the backup: {e}")
-        if 'pbar' in globals():
-            pbar.close()  # 如果进度条存在，则关闭它
+    # 恢复写入的文件不是新的游戏保存，不应触发自动快照
+    auto_snapshotters[manager.name].reset()
+
 
-def on_copy_hotkey():
+def on_copy_hotkey(manager):
     """当按下指定热键时调用此函数来执行文件夹复制"""
-    print("Copy hotkey triggered.")
-    copy_folder_with_timestamp(SRC_PATH, DST_DIR)
+    print(f"Copy hotkey triggered for {manager.name}.")
+    # 只入队后立即返回，不阻塞键盘钩子线程；正在进行的备份会合并重复按键
+    # 操作记录在按键时创建，排队等待的时间也会记入日志
+    job_workers[manager.name].submit(backup_job, manager, manager.operation('backup', trigger='hotkey'),
+                                     coalesce_key='backup')
 
 
-def on_restore_hotkey(index):
+def on_restore_hotkey(manager, index):
     """当按下指定热键时调用此函数来恢复指定编号的备份"""
-    print(f"Restore hotkey {index} triggered.")
-    restore_backup(index)
+    print(f"Restore hotkey {index} triggered for {manager.name}.")
+    job_workers[manager.name].submit(restore_job, manager, index, manager.operation('restore', trigger='hotkey'))
 
 
-def add_restore_hotkeys():
+def add_restore_hotkeys(manager, restore_hotkey_base):
     """为每个恢复操作添加热键监听器"""
     for i in range(1, 10):
-        hotkey = f"{RESTORE_HOTKEY_BASE}+{i}"
-        keyboard.add_hotkey(hotkey, lambda idx=i: on_restore_hotkey(idx), suppress=False)
+        hotkey = f"{restore_hotkey_base}+{i}"
+        keyboard.add_hotkey(hotkey, lambda idx=i: on_restore_hotkey(manager, idx), suppress=False)
 
 
-def initialize_program():
-    """初始化程序，确保备份文件夹存在并加载现有存档"""
-    verify_noita_path(config)
-    ensure_backup_directory_exists()
-    load_existing_backups()
+def profile_hotkeys(manager):
+    """返回存档配置的 (备份热键, 恢复热键前缀)；默认存档未配置时使用默认热键，其他存档未配置时没有热键"""
+    if manager is managers[0]:
+        return manager.copy_hotkey or COPY_HOTKEY, manager.restore_hotkey or RESTORE_HOTKEY_BASE
+    return manager.copy_hotkey, manager.restore_hotkey
+
+
+def initialize_program(config_path=None):
+    """初始化程序：只读取配置并创建各个对象，读取目录表等较慢的工作由 load_job 在后台进行"""
+    global managers
+    load_settings(config_path)
+    try:
+        managers = savemanager.load_profiles(config)
+    except savemanager.ConfigError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    for manager in managers:
+        if manager.noita_path not in noita_watchers:
+            verify_noita_path(manager.config)
+            noita_watchers[manager.noita_path] = procwatch.ProcessWatcher(manager.noita_path, PROCESS_RESCAN_INTERVAL)
+        # 只复查缓存的 PID，完整的进程扫描由后台线程低频进行
+        manager.is_game_running = noita_watchers[manager.noita_path].is_running
+        job_workers[manager.name] = jobs.JobWorker(name=f'backup-worker-{manager.name}')
+        auto_snapshotters[manager.name] = watcher.AutoSnapshotter(
+            manager.src_path, lambda m=manager: on_save_folder_quiet(m),
+            float(manager.config.get('auto_snapshot_quiet_seconds', AUTO_SNAPSHOT_QUIET_SECONDS)),
+            float(manager.config.get('auto_snapshot_poll_interval', AUTO_SNAPSHOT_POLL_INTERVAL)))
 
 
 def main():
-    initialize_program()
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Hotkeys for backing up and restoring Noita saves.")
+    parser.add_argument('--config', help="path to config.json (default: config.json next to the program)")
+    initialize_program(parser.parse_args().config)
     print("Starting program...")
     try:
-        print(f"Press {COPY_HOTKEY.upper()} to copy the folder.")
-        print(f"Press {RESTORE_HOTKEY_BASE.upper()} + [1-9] to restore a specific backup.")
+        # 进程扫描（首次使用时才导入 psutil）和读取目录表都在后台线程中进行，热键可以立即注册
+        for noita_watcher in noita_watchers.values():
+            noita_watcher.start()
+        for manager in managers:
+            job_workers[manager.name].start()
+            job_workers[manager.name].submit(load_job, manager)
+        # 所有配置共用一个同步线程，等默认配置读取目录表之后再开始
+        if managers[0].shared.replicator is not None:
+            job_workers[managers[0].name].submit(managers[0].shared.replicator.start)
+        for manager in managers:
+            copy_hotkey, restore_hotkey_base = profile_hotkeys(manager)
+            suffix = f" ({manager.name})" if len(managers) > 1 else ""
+            if copy_hotkey:
+                print(f"Press {copy_hotkey.upper()} to copy the folder{suffix}.")
+            if restore_hotkey_base:
+                print(f"Press {restore_hotkey_base.upper()} + [1-9] to restore a specific backup{suffix}.")
+            if copy_hotkey:
+                keyboard.add_hotkey(copy_hotkey, lambda m=manager: on_copy_hotkey(m), suppress=False)
+            if restore_hotkey_base:
+                add_restore_hotkeys(manager, restore_hotkey_base)
         print(f"Press {EXIT_HOTKEY.upper()} to exit.")
-
-        keyboard.add_hotkey(COPY_HOTKEY, on_copy_hotkey, suppress=False)
-        add_restore_hotkeys()
-        print("Hotkeys added successfully.")
+        print(f"Hotkeys added successfully in {time.perf_counter() - started:.3f} s.")
         keyboard.wait(EXIT_HOTKEY)
         print("Exit hotkey pressed.")
+        if any(job_worker.is_busy() for job_worker in job_workers.values()):
+            print("Waiting for the running backup/restore to finish...")
+        for job_worker in job_workers.values():
+            job_worker.stop()
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         import traceback
@@ -298,4 +258,4 @@ if __name__ == "__main__":
         print(f"An unexpected error occurred: {e}")
         import traceback
 
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
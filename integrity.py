@@ -0,0 +1,124 @@
+"""按快照清单校验快照完整性：文件是否缺失、多出、大小或摘要不符"""
+import os
+import tarfile
+import functools
+
+import archive
+import catalog
+import copyengine
+import store
+
+
+def manifest_for(path):
+    """返回快照对应的清单路径，旧版本留下的没有清单的快照返回 None"""
+    kind = catalog.snapshot_kind(path)
+    if kind == 'store':
+        return path
+    if kind is None:
+        return None
+    sidecar = store.sidecar_manifest_path(os.path.dirname(os.path.abspath(path)), catalog.snapshot_name(path, kind))
+    return sidecar if os.path.exists(sidecar) else None
+
+
+def _check_file(path, rel_file, entry, read_function=None):
+    """read_function(path) 返回文件内容时经由它读取（例如恢复缓存），否则直接读文件计算摘要"""
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return f"missing: {rel_file}"
+    except OSError as e:
+        return f"unreadable: {rel_file} ({e})"
+    if size != entry['size']:
+        return f"size mismatch: {rel_file} ({size} != {entry['size']})"
+    try:
+        if read_function is not None:
+            hasher = store.new_hasher()
+            hasher.update(read_function(path))
+            digest = hasher.hexdigest()
+        else:
+            digest = store.hash_file(path)
+    except OSError as e:
+        return f"unreadable: {rel_file} ({e})"
+    if digest != entry['hash']:
+        return f"hash mismatch: {rel_file}"
+    return None
+
+
+def _verify_folder(path, manifest, workers, read_function=None):
+    problems = []
+    for root, _, filenames in os.walk(path):
+        for file_name in filenames:
+            rel_file = store.relpath_key(os.path.join(root, file_name), path)
+            if rel_file not in manifest['files']:
+                problems.append(f"unexpected file: {rel_file}")
+    tasks = [(os.path.join(path, *rel_file.split('/')), rel_file, entry)
+             for rel_file, entry in manifest['files'].items()]
+    check = functools.partial(_check_file, read_function=read_function)
+    problems.extend(p for p in copyengine.run_parallel(check, tasks, workers) if p)
+    return problems
+
+
+def _verify_store(path, manifest, workers, read_function=None):
+    dst_dir = os.path.dirname(os.path.abspath(path))
+    # 同一对象可能被多个路径引用，只校验一次；分块保存的文件逐块校验
+    objects = {}
+    for rel_file, entry in manifest['files'].items():
+        if 'chunks' in entry:
+            for i, (digest, size) in enumerate(entry['chunks']):
+                objects.setdefault(digest, (f"{rel_file} (chunk {i})", {'size': size, 'hash': digest}))
+        else:
+            objects.setdefault(entry['hash'], (rel_file, entry))
+    tasks = [(store.object_path(dst_dir, digest), rel_file, entry) for digest, (rel_file, entry) in objects.items()]
+    check = functools.partial(_check_file, read_function=read_function)
+    return [p for p in copyengine.run_parallel(check, tasks, workers) if p]
+
+
+def _verify_archive(path, manifest):
+    """压缩快照只能顺序解压，边读边计算摘要，不落盘"""
+    problems = []
+    seen = set()
+    with archive.open_tar(path) as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            entry = manifest['files'].get(member.name)
+            if entry is None:
+                problems.append(f"unexpected file: {member.name}")
+                continue
+            seen.add(member.name)
+            hasher = store.new_hasher()
+            f = tar.extractfile(member)
+            for chunk in iter(lambda: f.read(store.HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+            if member.size != entry['size']:
+                problems.append(f"size mismatch: {member.name} ({member.size} != {entry['size']})")
+            elif hasher.hexdigest() != entry['hash']:
+                problems.append(f"hash mismatch: {member.name}")
+    problems.extend(f"missing: {rel_file}" for rel_file in manifest['files'] if rel_file not in seen)
+    return problems
+
+
+def verify_snapshot(path, workers=copyengine.DEFAULT_WORKERS, read_function=None):
+    """校验快照，返回问题列表（空列表表示完好）；没有清单时返回 None。
+
+    read_function 为 RestoreCache.read 时文件夹和对象库快照经由恢复缓存读取，随后的复制直接使用校验过的内容；
+    压缩快照总是流式解压
+    """
+    manifest_path = manifest_for(path)
+    if manifest_path is None:
+        return None
+    try:
+        manifest = store.load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        return [f"unreadable manifest: {e}"]
+
+    kind = manifest['kind']
+    if kind == 'store':
+        return _verify_store(path, manifest, workers, read_function)
+    if kind == 'archive':
+        try:
+            return _verify_archive(path, manifest)
+        except (OSError, EOFError, ValueError, tarfile.TarError) as e:
+            # ValueError 来自 open_tar 拒绝的不安全成员路径
+            return [f"unreadable archive: {e}"]
+    return _verify_folder(path, manifest, workers, read_function)
@@ -0,0 +1,121 @@
+"""后台任务：同一个存档的文件操作都在同一个工作线程里串行执行，热键回调只负责入队；
+清理、预暂存和后端同步各自在一个低优先级线程中按请求合并执行"""
+import os
+import sys
+import queue
+import threading
+import traceback
+
+DEFAULT_QUEUE_SIZE = 16
+
+
+def lower_thread_priority():
+    """尽量降低当前线程的调度优先级，失败时忽略"""
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            THREAD_PRIORITY_LOWEST = -2
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_LOWEST)
+        elif hasattr(os, 'setpriority') and sys.platform.startswith('linux'):
+            # Linux 上每个线程有自己的 nice 值
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (OSError, AttributeError):
+        pass
+
+
+class CoalescingTask:
+    """低优先级的后台线程，每次 request() 后执行一次 func()；执行期间的多次请求合并为下一次执行。
+
+    description 用于错误信息，例如 'pruning old backups'；func 抛出的异常只打印，线程继续等待下一次请求
+    """
+
+    def __init__(self, func, name, description):
+        self.func = func
+        self.description = description
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self, run_now=False):
+        """启动线程；run_now 为 True 时不等请求先执行一次"""
+        if run_now:
+            self._wakeup.set()
+        self._thread.start()
+
+    def request(self):
+        self._wakeup.set()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        lower_thread_priority()
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.func()
+            except Exception as e:
+                print(f"An error occurred while {self.description}: {e}")
+                traceback.print_exc()
+
+
+class JobWorker:
+    """单个工作线程 + 有界队列。
+
+    带相同 coalesce_key 的任务在排队或执行期间只保留一个，
+    例如备份还没做完时重复按下的备份热键会被合并掉。
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, name='backup-worker'):
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._active_keys = set()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, func, *args, coalesce_key=None):
+        """把任务放入队列并立即返回，返回 False 表示任务被合并或队列已满"""
+        if coalesce_key is not None:
+            with self._lock:
+                if coalesce_key in self._active_keys:
+                    print(f"'{coalesce_key}' is already pending, ignoring repeated request.")
+                    return False
+                self._active_keys.add(coalesce_key)
+        try:
+            self._queue.put_nowait((func, args, coalesce_key))
+        except queue.Full:
+            self._release(coalesce_key)
+            print("Job queue is full, ignoring request.")
+            return False
+        return True
+
+    def stop(self, wait=True):
+        """等待已入队的任务完成后结束工作线程"""
+        self._queue.put((None, (), None))
+        if wait:
+            self._thread.join()
+
+    def is_busy(self):
+        return self._queue.unfinished_tasks > 0
+
+    def _release(self, coalesce_key):
+        if coalesce_key is not None:
+            with self._lock:
+                self._active_keys.discard(coalesce_key)
+
+    def _run(self):
+        while True:
+            func, args, coalesce_key = self._queue.get()
+            try:
+                if func is None:
+                    return
+                func(*args)
+            except Exception as e:
+                print(f"An error occurred in background job: {e}")
+                traceback.print_exc()
+            finally:
+                self._release(coalesce_key)
+                self._queue.task_done()
@@ -0,0 +1,154 @@
+"""操作日志：记录每次备份和恢复各阶段的耗时、文件数和字节数，写入备份目录下按大小轮转的 JSON Lines 文件
+
+每行一个操作，例如:
+    {"time": "...", "op": "restore", "trigger": "hotkey", "ok": true, "seconds": 1.23,
+     "phases": [{"name": "verify", "seconds": 0.4, "files": 5000, "bytes": 20480000}, ...]}
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import store
+
+LOG_FILENAME = 'operations.jsonl'
+# 超过这个大小就轮转为 operations.jsonl.1、.2 ……，最多保留 MAX_BACKUPS 个旧文件
+MAX_BYTES = 1024 * 1024
+MAX_BACKUPS = 3
+
+
+class OperationLog:
+    def __init__(self, dst_dir, max_bytes=MAX_BYTES, max_backups=MAX_BACKUPS):
+        self.path = store.meta_path(dst_dir, LOG_FILENAME)
+        self.max_bytes = max_bytes
+        self.max_backups = max_backups
+        self._lock = threading.Lock()
+
+    def operation(self, op, **fields):
+        return Operation(self, op, **fields)
+
+    def _rotate(self):
+        for i in range(self.max_backups - 1, 0, -1):
+            older = f'{self.path}.{i}'
+            if os.path.exists(older):
+                os.replace(older, f'{self.path}.{i + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            try:
+                if os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+            except FileNotFoundError:
+                pass
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def records(self):
+        """按时间从旧到新读取全部记录（包括已轮转的文件），跳过损坏的行"""
+        paths = [f'{self.path}.{i}' for i in range(self.max_backups, 0, -1)] + [self.path]
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                continue
+
+
+class Operation:
+    """一次备份或恢复。with 块结束时写入日志，异常会被记录为失败后继续抛出。
+
+    可以在进入 with 之前创建（例如按下热键时），这样排队等待的时间也会记录为 queue 阶段。
+    """
+
+    def __init__(self, log, op, **fields):
+        self.log = log
+        self.op = op
+        self.fields = fields
+        self.phases = []
+        self.created = time.perf_counter()
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        if self.started - self.created > 0.001:
+            self.record('queue', self.started - self.created)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.created
+        record = {'time': datetime.now().isoformat(timespec='seconds'), 'op': self.op, **self.fields,
+                  'ok': exc_type is None, 'seconds': round(seconds, 6), 'phases': self.phases}
+        if exc is not None:
+            record['error'] = str(exc) or exc_type.__name__
+        try:
+            self.log.write(record)
+        except OSError as e:
+            print(f"Warning: Failed to write operation log: {e}")
+        print(f"{self.op} took {seconds:.3f} s (" + ', '.join(
+            f"{phase['name']} {phase['seconds']:.3f} s" for phase in self.phases) + ")")
+        return False
+
+    def record(self, name, seconds, files=None, size=None):
+        phase = {'name': name, 'seconds': round(seconds, 6)}
+        if files is not None:
+            phase['files'] = files
+        if size is not None:
+            phase['bytes'] = size
+        self.phases.append(phase)
+        return phase
+
+    @contextmanager
+    def span(self, name, files=None, size=None):
+        """计时一个阶段；块内可以修改返回的字典补充 files 和 bytes"""
+        start = time.perf_counter()
+        phase = self.record(name, 0, files, size)
+        try:
+            yield phase
+        finally:
+            phase['seconds'] = round(time.perf_counter() - start, 6)
+
+
+def percentile(values, p):
+    """最近秩法的百分位数，values 需已排序"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def stats(records):
+    """按 (操作, 阶段) 汇总耗时，返回 {(op, phase): (次数, p50, p95)}，phase 为 'total' 表示整个操作"""
+    samples = {}
+    for record in records:
+        if not record.get('ok'):
+            continue
+        samples.setdefault((record['op'], 'total'), []).append(record['seconds'])
+        for phase in record.get('phases', []):
+            samples.setdefault((record['op'], phase['name']), []).append(phase['seconds'])
+    result = {}
+    for key, values in samples.items():
+        values.sort()
+        result[key] = (len(values), percentile(values, 50), percentile(values, 95))
+    return result
+
+
+def cache_stats(records):
+    """汇总恢复记录中的缓存命中与淘汰，返回 {'restores', 'hits', 'misses', 'hit_bytes', 'evictions', 'evicted_bytes'}"""
+    totals = {'restores': 0, 'hits': 0, 'misses': 0, 'hit_bytes': 0, 'evictions': 0, 'evicted_bytes': 0}
+    for record in records:
+        cache = record.get('cache')
+        if not cache:
+            continue
+        totals['restores'] += 1
+        for key in ('hits', 'misses', 'hit_bytes', 'evictions', 'evicted_bytes'):
+            totals[key] += cache.get(key, 0)
+    return totals
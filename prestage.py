@@ -0,0 +1,143 @@
+"""恢复槽位预暂存：空闲时在存档旁边准备好 1 号（可选 2 号）槽位的完整副本，恢复时只需改名替换
+
+副本放在存档文件夹同级的 save00.staged 目录下，每个子目录以快照名命名，只有完整写好后才改成这个名字；
+有新快照时以不再需要的旧副本为底做差异恢复，只改写变化的文件。恢复消耗掉的副本由被替换下来的旧存档补上，
+同样只需写入差异。占用的磁盘空间最多为 slots 份存档大小，每次更新后打印出来。
+"""
+import os
+import time
+import shutil
+import threading
+
+import browse
+import catalog
+import diffrestore
+import jobs
+import swap
+
+# 正在写入的副本，写完后改名为快照名
+BUILDING_DIRNAME = '.building'
+MAX_SLOTS = 2
+
+
+def staged_root(src_path):
+    """与存档在同一个卷上，改名替换才是原子的"""
+    return os.path.normpath(src_path) + '.staged'
+
+
+class Prestager:
+    """后台预暂存线程：每次快照或恢复后调用 request()，多次请求会合并为一次更新。
+
+    get_recent() 返回最近的快照路径（第一个为 1 号槽位），content_path(path) 返回快照中存放存档内容的目录，
+    verify(path) 不为 None 时在暂存前校验快照，校验失败的快照不会被暂存；max_bytes 限制所有副本的总大小。
+    恢复时通过 take() 取用副本，副本正在更新时 take() 立即返回 False，由调用方按普通方式恢复。
+    """
+
+    def __init__(self, src_path, slots, fs_lock, get_recent, content_path, verify=None, max_bytes=None,
+                 workers=1):
+        self.src_path = src_path
+        self.root = staged_root(src_path)
+        self.slots = max(0, min(int(slots or 0), MAX_SLOTS))
+        self.fs_lock = fs_lock
+        self.get_recent = get_recent
+        self.content_path = content_path
+        self.verify = verify
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        # 本次运行中已经与快照比对过的副本，之后不再逐个检查
+        self._checked = set()
+        self._task = jobs.CoalescingTask(self.refresh, 'slot-prestager', 'pre-staging restore slots')
+
+    def is_running(self):
+        """只有后台线程在本进程中运行时才使用副本，避免与另一个进程的更新冲突"""
+        return self._task.is_alive()
+
+    def start(self):
+        if self.slots:
+            # 启动后先检查上次留下的副本
+            self._task.start(run_now=True)
+
+    def request(self):
+        self._task.request()
+
+    def _staged_names(self):
+        try:
+            return [name for name in os.listdir(self.root) if not name.startswith('.')]
+        except FileNotFoundError:
+            return []
+
+    def refresh(self):
+        with self.fs_lock:
+            recent = self.get_recent()[:self.slots]
+        wanted = [(path, catalog.snapshot_name(path, catalog.snapshot_kind(path))) for path in recent]
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            building = os.path.join(self.root, BUILDING_DIRNAME)
+            spare = [name for name in self._staged_names() if name not in {name for _, name in wanted}]
+            total_bytes = 0
+            for slot, (path, name) in enumerate(wanted, 1):
+                staged = os.path.join(self.root, name)
+                content_path = self.content_path(path)
+                size = sum(entry['size'] for entry in browse.snapshot_files(path, content_path).values())
+                if self.max_bytes is not None and total_bytes + size > self.max_bytes:
+                    print(f"Not pre-staging slot {slot}: it would exceed prestage_max_bytes ({self.max_bytes} bytes).")
+                    if os.path.isdir(staged):
+                        spare.append(name)
+                    continue
+                if os.path.isdir(staged) and name in self._checked:
+                    total_bytes += size
+                    continue
+                if self.verify is not None and not os.path.isdir(staged) and not self.verify(path):
+                    continue
+                total_bytes += size
+
+                start = time.perf_counter()
+                if os.path.isdir(staged):
+                    # 上次运行留下的副本：比对一遍，补上被改动的文件
+                    base = staged
+                else:
+                    # 以不再需要的旧副本为底，只写入差异
+                    if not os.path.isdir(building) and spare:
+                        os.rename(os.path.join(self.root, spare.pop()), building)
+                    base = building
+                written_files, written_bytes, deleted_files, unchanged_files = diffrestore.diff_restore(
+                    path, content_path, base, workers=self.workers)
+                if base != staged:
+                    os.rename(building, staged)
+                self._checked.add(name)
+                print(f"Pre-staged slot {slot} ({name}) in {time.perf_counter() - start:.3f} s "
+                      f"({written_files} files / {written_bytes} bytes written, {unchanged_files} unchanged)")
+
+            # 多余的副本不保留，占用的空间不超过 slots 份存档
+            for name in spare:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                self._checked.discard(name)
+            shutil.rmtree(building, ignore_errors=True)
+        print(f"Pre-staged restore slots use {total_bytes} bytes next to {self.src_path}.")
+
+    def take(self, backup_path, dst):
+        """用预暂存的副本替换 dst，返回 True；没有可用副本或副本正在更新时返回 False"""
+        if not self.is_running():
+            return False
+        name = catalog.snapshot_name(backup_path, catalog.snapshot_kind(backup_path))
+        if not self._lock.acquire(blocking=False):
+            print("Restore slots are being pre-staged, restoring normally.")
+            return False
+        try:
+            staged = os.path.join(self.root, name)
+            if name not in self._checked or not os.path.isdir(staged):
+                return False
+            old = swap.swap_in(staged, dst, keep_old=True)
+            self._checked.discard(name)
+            # 被替换下来的旧存档通常与刚恢复的快照相差不多，留作下一个副本的底
+            building = os.path.join(self.root, BUILDING_DIRNAME)
+            if old is not None:
+                if os.path.exists(building):
+                    shutil.rmtree(old, ignore_errors=True)
+                else:
+                    os.rename(old, building)
+        finally:
+            self._lock.release()
+        self.request()
+        return True
@@ -0,0 +1,94 @@
+"""检测游戏进程：找到后缓存其 PID，之后只复查这一个进程，完整扫描放到低频的后台线程中
+
+在 Linux 上可以复制任意可执行文件（例如 /bin/sleep）并把 noita_path 指向它来测试。
+"""
+import os
+import threading
+import time
+
+DEFAULT_RESCAN_INTERVAL = 5.0
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.realpath(path))
+
+
+class ProcessWatcher:
+    def __init__(self, exe_path, rescan_interval=DEFAULT_RESCAN_INTERVAL):
+        self.exe_path = _normalize(exe_path)
+        self.exe_name = os.path.basename(exe_path).lower()
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._proc = None
+        self._last_scan = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='process-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _matches(self, proc):
+        import psutil
+        try:
+            exe = proc.exe()
+            return bool(exe) and _normalize(exe) == self.exe_path
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return False
+
+    def _alive(self, proc):
+        # is_running 会比对创建时间，PID 被别的进程复用时返回 False
+        import psutil
+        try:
+            return proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+    def scan(self):
+        """完整扫描一次进程列表，先按进程名过滤，只对同名进程读取 exe 路径"""
+        # psutil 在第一次扫描时才导入，热键程序中这发生在后台线程里，不拖慢启动
+        import psutil
+        found = None
+        for proc in psutil.process_iter(['name']):
+            name = (proc.info['name'] or '').lower()
+            if name != self.exe_name:
+                continue
+            if self._matches(proc):
+                found = proc
+                break
+        with self._lock:
+            self._proc = found
+            self._last_scan = time.monotonic()
+        return found is not None
+
+    def is_running(self, cached_negative=False):
+        """缓存的进程仍存活就直接返回，否则同步扫描一次。
+
+        恢复前的检查（默认）总是重新扫描：上一次扫描之后启动的游戏也要能阻止恢复，而且恢复很少、扫描只需几十毫秒。
+        cached_negative 为 True 时（后台或周期性的调用方），最近一次扫描未过期就沿用它“没有运行”的结果
+        """
+        with self._lock:
+            proc = self._proc
+            last_scan = self._last_scan
+        if proc is not None:
+            if self._alive(proc):
+                return True
+            # 缓存的进程已退出，游戏可能已经重新启动，立即重新扫描
+            return self.scan()
+        if cached_negative and last_scan is not None and time.monotonic() - last_scan < self.rescan_interval:
+            return False
+        return self.scan()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                proc = self._proc
+            # 缓存的进程仍存活时不需要扫描
+            if proc is None or not self._alive(proc):
+                try:
+                    self.scan()
+                except Exception as e:
+                    print(f"Warning: Process scan failed: {e}")
+            self._stop.wait(self.rescan_interval)
@@ -0,0 +1,49 @@
+"""恢复进度的回调接口：SaveManager 只调用 start/update/close，由前端决定如何显示
+
+热键程序和命令行用 TqdmProgress 在终端显示字节进度、速度和剩余时间；
+其他前端（例如图形界面）继承 Progress 实现这三个方法即可。
+"""
+
+
+class Progress:
+    """默认什么也不显示。
+
+    SaveManager 在内部加锁后再调用 update，即使复制在多个线程中进行，实现也无需考虑线程安全
+    """
+
+    def start(self, total_files, total_bytes):
+        """开始写入前调用一次；总数事先未知（例如没有清单的压缩快照）时为 None"""
+
+    def update(self, files, nbytes):
+        """每写完一批文件后调用，参数为这一批的文件数和字节数"""
+
+    def close(self):
+        """结束时调用，无论成功还是失败"""
+
+
+class TqdmProgress(Progress):
+    """终端进度条，按字节计，显示速度和剩余时间；只在开始恢复时才导入 tqdm"""
+
+    def __init__(self, desc='Restoring Backup'):
+        self.desc = desc
+        self._bar = None
+        self._files = 0
+        self._total_files = None
+
+    def start(self, total_files, total_bytes):
+        from tqdm import tqdm
+        self._total_files = total_files
+        self._bar = tqdm(total=total_bytes, unit='B', unit_scale=True, unit_divisor=1024, desc=self.desc)
+
+    def update(self, files, nbytes):
+        self._files += files
+        if self._total_files is not None:
+            self._bar.set_postfix_str(f"{self._files}/{self._total_files} files", refresh=False)
+        else:
+            self._bar.set_postfix_str(f"{self._files} files", refresh=False)
+        self._bar.update(nbytes)
+
+    def close(self):
+        if self._bar is not None:
+            self._bar.close()
+            self._bar = None
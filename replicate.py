@@ -0,0 +1,146 @@
+"""把本地备份目录同步到存储后端：快照完成后在后台线程中上传，不影响热键的响应
+
+只上传目录表中已完成的快照（文件夹快照中的文件、压缩包、对象库清单及其引用的对象）和它们的旁路清单，
+后端中已有同名且大小相同的文件不再上传；快照写入后不会再修改，对象按内容命名，这样比较就足够了。
+后端中的文件不会因为本地清理而删除。pull() 把后端中的备份取回本地，用于本地磁盘损坏之后。
+"""
+import os
+import traceback
+
+import catalog
+import copyengine
+import jobs
+import store
+
+
+def _entry_files(dst_dir, entry):
+    """返回一个快照需要同步的本地文件 [(键, 路径)]"""
+    path = os.path.join(dst_dir, entry['path'])
+    files = []
+    if entry['kind'] == 'folder':
+        for root, _, filenames in os.walk(path):
+            for file_name in filenames:
+                file_path = os.path.join(root, file_name)
+                files.append((store.relpath_key(file_path, dst_dir), file_path))
+    else:
+        files.append((entry['path'], path))
+    if entry['kind'] == 'store':
+        digests = set()
+        for file_entry in store.load_manifest(path)['files'].values():
+            digests.update(store.entry_objects(file_entry))
+        for digest in digests:
+            obj = store.object_path(dst_dir, digest)
+            files.append((store.relpath_key(obj, dst_dir), obj))
+    else:
+        sidecar = store.sidecar_manifest_path(dst_dir, entry['name'])
+        if os.path.exists(sidecar):
+            files.append((store.relpath_key(sidecar, dst_dir), sidecar))
+    return files
+
+
+class Replicator:
+    """后台同步线程：每次快照后调用 request()，多次请求会合并为一次同步。
+
+    get_catalog() 返回当前的目录表，oplog 为 oplog.OperationLog，每次同步记录为一条 'sync' 操作。
+    同步期间不持有任何锁：被清理删除的文件会被跳过，下次同步时不再出现
+    """
+
+    def __init__(self, dst_dir, backends, get_catalog, oplog, workers=copyengine.DEFAULT_WORKERS):
+        self.dst_dir = dst_dir
+        self.backends = backends
+        self.get_catalog = get_catalog
+        self.oplog = oplog
+        self.workers = workers
+        # 快照不会再修改，列出过的文件列表可以一直使用
+        self._files_cache = {}
+        self._task = jobs.CoalescingTask(self.sync_all, 'backend-sync', 'syncing backups')
+
+    def start(self):
+        if self.backends:
+            # 启动后先补上上次退出前没来得及同步的快照
+            self._task.start(run_now=True)
+
+    def request(self):
+        self._task.request()
+
+    def sync_all(self):
+        """依次同步到每个后端，一个后端失败不影响其他后端"""
+        for backend in self.backends:
+            try:
+                self.sync(backend)
+            except Exception as e:
+                print(f"An error occurred while syncing backups to {backend.name}: {e}")
+                traceback.print_exc()
+
+    def local_files(self):
+        """返回需要同步的全部本地文件 {键: 路径}"""
+        files = {}
+        entries = catalog.sorted_entries(self.get_catalog())
+        for entry in entries:
+            key = (entry['path'], entry['timestamp'])
+            if key not in self._files_cache:
+                try:
+                    self._files_cache[key] = _entry_files(self.dst_dir, entry)
+                except (OSError, ValueError):
+                    continue
+            files.update(self._files_cache[key])
+        return files
+
+    def sync(self, backend):
+        """把尚未上传的文件上传到 backend，返回 (上传的文件数, 上传的字节数)"""
+        with self.oplog.operation('sync', backend=backend.name) as op:
+            with op.span('list') as phase:
+                local = self.local_files()
+                remote = backend.list_keys()
+                pending = []
+                for key, path in local.items():
+                    try:
+                        size = os.path.getsize(path)
+                    except FileNotFoundError:
+                        continue
+                    if remote.get(key) != size:
+                        pending.append((key, path, size))
+                phase.update(files=len(local))
+
+            def upload(key, path, size):
+                try:
+                    backend.put_file(key, path)
+                except FileNotFoundError:
+                    # 同步期间被清理删除
+                    return 0, 0
+                return 1, size
+
+            with op.span('upload') as phase:
+                results = copyengine.run_parallel(upload, pending, self.workers)
+                uploaded_files = sum(files for files, _ in results)
+                uploaded_bytes = sum(size for _, size in results)
+                phase.update(files=uploaded_files, bytes=uploaded_bytes)
+            op.fields.update(files=uploaded_files, bytes=uploaded_bytes)
+            print(f"Synced backups to {backend.name}: {uploaded_files} files / {uploaded_bytes} bytes uploaded, "
+                  f"{len(local) - len(pending)} already present.")
+        return uploaded_files, uploaded_bytes
+
+
+def pull(backend, dst_dir, workers=copyengine.DEFAULT_WORKERS):
+    """把 backend 中本地没有（或大小不同）的文件下载到 dst_dir，返回 (下载的文件数, 下载的字节数)。
+
+    下载完成后重新加载即可看到这些快照（目录表会因备份目录被修改而重建）
+    """
+    remote = backend.list_keys()
+    pending = []
+    for key, size in remote.items():
+        path = os.path.join(dst_dir, *key.split('/'))
+        try:
+            if os.path.getsize(path) == size:
+                continue
+        except FileNotFoundError:
+            pass
+        pending.append((key, path, size))
+
+    def download(key, path, size):
+        backend.get_file(key, path)
+        return size
+
+    downloaded = copyengine.run_parallel(download, pending, workers)
+    print(f"Pulled {len(pending)} files / {sum(downloaded)} bytes from {backend.name} into {dst_dir}.")
+    return len(pending), sum(downloaded)
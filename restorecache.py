@@ -0,0 +1,94 @@
+"""恢复缓存：在内存中保留最近恢复过的快照文件内容，反复恢复同一个快照时只剩写入
+
+按字节预算做 LRU 淘汰；大文件不复制到内存，而是用 mmap 映射备份中的文件，由系统页缓存保留内容。
+缓存按源文件路径和 (大小, 修改时间) 识别，快照被改写后自然失效；快照被删除前须调用 invalidate()，
+否则 Windows 上被映射的文件无法删除。
+"""
+import os
+import mmap
+import threading
+from collections import OrderedDict
+
+DEFAULT_MMAP_BYTES = 4 * 1024 * 1024
+
+
+class RestoreCache:
+    def __init__(self, max_bytes, mmap_bytes=DEFAULT_MMAP_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.mmap_bytes = int(mmap_bytes)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def _read(self, src, size):
+        with open(src, 'rb') as f:
+            if size >= self.mmap_bytes:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
+
+    def _insert(self, key, signature, data):
+        size = signature[0]
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[0][0]
+            self._entries[key] = (signature, data)
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _, ((evicted_size, _), _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+                self.evicted_bytes += evicted_size
+
+    def copy(self, src, dst):
+        """与 copyengine.fast_copy 用法相同的复制函数：命中时直接写入缓存的内容，未命中时读一遍源文件并放入缓存"""
+        data, st = self._get(src)
+        with open(dst, 'wb') as f:
+            f.write(data)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return dst
+
+    def read(self, src):
+        """返回 src 的内容（bytes 或 mmap），与 copy 共用缓存；对象库中分块保存的文件按块经由这里读取"""
+        return self._get(src)[0]
+
+    def _get(self, src):
+        st = os.stat(src)
+        signature = (st.st_size, st.st_mtime_ns)
+        key = os.path.abspath(src)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.hit_bytes += st.st_size
+                data = entry[1]
+            else:
+                self.misses += 1
+                data = None
+        if data is None:
+            # 空文件无法 mmap
+            data = self._read(src, st.st_size) if st.st_size else b''
+            if st.st_size <= self.max_bytes:
+                self._insert(key, signature, data)
+        return data, st
+
+    def invalidate(self, path):
+        """丢弃 path 本身及其下所有文件的缓存，在删除快照或回收对象之前调用"""
+        prefix = os.path.join(os.path.abspath(path), '')
+        with self._lock:
+            for key in [key for key in self._entries if key == prefix[:-1] or key.startswith(prefix)]:
+                (size, _), _ = self._entries.pop(key)
+                self._size -= size
+
+    def stats(self):
+        """返回累计的命中、未命中、淘汰次数和当前占用，写入操作日志"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'hit_bytes': self.hit_bytes,
+                    'evictions': self.evictions, 'evicted_bytes': self.evicted_bytes,
+                    'files': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes}
@@ -0,0 +1,222 @@
+"""快照保留策略：按配置保留最近 N 个、每小时/每天各一个以及总大小上限，在低优先级后台线程中清理"""
+import os
+import shutil
+
+import catalog
+import jobs
+import store
+
+POLICY_KEYS = ('keep_last', 'keep_hourly', 'keep_daily', 'max_total_bytes')
+
+
+def is_enabled(policy):
+    return any(policy.get(key) is not None for key in POLICY_KEYS)
+
+
+def _keep_per_bucket(entries, count, bucket_len):
+    """在最近 count 个时间段（按时间戳前缀划分）中各保留最新的一个"""
+    kept = set()
+    buckets = set()
+    for entry in entries:
+        bucket = entry['timestamp'][:bucket_len]
+        if bucket in buckets:
+            continue
+        if len(buckets) >= count:
+            break
+        buckets.add(bucket)
+        kept.add(entry['path'])
+    return kept
+
+
+def disk_usage(dst_dir, entry):
+    """快照实际占用的磁盘空间，返回 {存储单元: 字节数}。
+
+    对象库快照共用对象，文件夹快照之间用硬链接共用未变化的文件，同一个存储单元在多个快照中只占一份空间；
+    快照已不存在或清单损坏时返回空表
+    """
+    path = os.path.join(dst_dir, entry['path'])
+    units = {}
+    try:
+        if entry['kind'] == 'store':
+            for file_entry in store.load_manifest(path)['files'].values():
+                if 'chunks' in file_entry:
+                    for digest, size in file_entry['chunks']:
+                        units[('object', digest)] = size
+                else:
+                    units[('object', file_entry['hash'])] = file_entry['size']
+        elif entry['kind'] == 'folder':
+            for root, _, filenames in os.walk(path):
+                for file_name in filenames:
+                    st = os.lstat(os.path.join(root, file_name))
+                    units[('inode', st.st_dev, st.st_ino)] = st.st_size
+        else:
+            units[('file', entry['path'])] = os.path.getsize(path)
+    except (OSError, ValueError):
+        return {}
+    return units
+
+
+def _logical_usage(entry):
+    return {('snapshot', entry['path']): entry['size'] or 0}
+
+
+def plan(entries, policy, protected=(), usage=None):
+    """entries 需按时间从新到旧排列，返回需要删除的记录列表（从旧到新）。
+
+    usage(记录) 返回快照占用的存储单元 {键: 字节数}（见 disk_usage），max_total_bytes 按保留下来的快照
+    合计的不重复存储单元计算；不传时按目录表中各快照文件大小之和计算
+    """
+    if not is_enabled(policy):
+        return []
+
+    protected = set(protected)
+    keep = set(protected)
+    if policy.get('keep_last') is not None:
+        keep.update(e['path'] for e in entries[:int(policy['keep_last'])])
+    if policy.get('keep_hourly') is not None:
+        keep.update(_keep_per_bucket(entries, int(policy['keep_hourly']), len('YYYY-mm-ddTHH')))
+    if policy.get('keep_daily') is not None:
+        keep.update(_keep_per_bucket(entries, int(policy['keep_daily']), len('YYYY-mm-dd')))
+    if not any(policy.get(key) is not None for key in ('keep_last', 'keep_hourly', 'keep_daily')):
+        # 只配置了总大小上限时，先全部保留，再按大小从旧到新删除
+        keep.update(e['path'] for e in entries)
+
+    delete = [e for e in reversed(entries) if e['path'] not in keep]
+
+    max_total_bytes = policy.get('max_total_bytes')
+    if max_total_bytes is not None:
+        kept_entries = [e for e in reversed(entries) if e['path'] in keep]
+        kept_units = [(usage or _logical_usage)(e) for e in kept_entries]
+        # 每个存储单元被多少个保留的快照引用，引用全部删除后才真正释放空间
+        refs = {}
+        sizes = {}
+        for units in kept_units:
+            for key, size in units.items():
+                refs[key] = refs.get(key, 0) + 1
+                sizes[key] = size
+        total = sum(sizes.values())
+        for entry, units in zip(kept_entries, kept_units):
+            if total <= int(max_total_bytes):
+                break
+            if entry['path'] in protected:
+                continue
+            delete.append(entry)
+            for key in units:
+                refs[key] -= 1
+                if not refs[key]:
+                    total -= sizes[key]
+    return delete
+
+
+def freed_bytes(dst_dir, entry):
+    """删除文件夹或压缩快照能释放的字节数：仍被其他快照硬链接的文件不计入；对象库快照由回收对象时统计"""
+    path = os.path.join(dst_dir, entry['path'])
+    try:
+        if entry['kind'] == 'folder':
+            freed = 0
+            for root, _, filenames in os.walk(path):
+                for file_name in filenames:
+                    st = os.lstat(os.path.join(root, file_name))
+                    if st.st_nlink <= 1:
+                        freed += st.st_size
+            return freed
+        if entry['kind'] != 'store':
+            return os.path.getsize(path)
+    except OSError:
+        pass
+    return 0
+
+
+def delete_snapshot(dst_dir, entry):
+    path = os.path.join(dst_dir, entry['path'])
+    if entry['kind'] == 'folder':
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+    if entry['kind'] != 'store':
+        try:
+            os.remove(store.sidecar_manifest_path(dst_dir, entry['name']))
+        except FileNotFoundError:
+            pass
+
+
+class Pruner:
+    """后台清理线程：每次快照后调用 request()，多次请求会合并为一次清理。
+
+    fs_lock 由备份和恢复在执行期间持有，清理每删除一个快照都会重新获取它，
+    因此不会与恢复或对象库快照同时进行。多个存档配置共用备份目录时，owns 限定只清理本配置的快照，
+    gc_lock 需要挡住所有配置的快照（对象库是共用的），默认与 fs_lock 相同。
+    on_delete(path) 在删除快照或回收对象库之前调用，用于释放缓存中对这些文件的引用。
+    """
+
+    def __init__(self, dst_dir, policy, fs_lock, get_catalog, get_protected, owns=None, gc_lock=None,
+                 on_delete=None):
+        self.dst_dir = dst_dir
+        self.policy = policy
+        self.fs_lock = fs_lock
+        self.get_catalog = get_catalog
+        self.get_protected = get_protected
+        self.owns = owns
+        self.gc_lock = gc_lock if gc_lock is not None else fs_lock
+        self.on_delete = on_delete
+        # 快照写入后不再修改，各快照的存储单元只需统计一次
+        self._usage_cache = {}
+        self._task = jobs.CoalescingTask(self.prune, 'retention-pruner', 'pruning old backups')
+
+    def start(self):
+        if is_enabled(self.policy):
+            self._task.start()
+
+    def request(self):
+        self._task.request()
+
+    def usage(self, entry):
+        """带缓存的 disk_usage，供 plan 计算 max_total_bytes"""
+        key = (entry['path'], entry['timestamp'])
+        if key not in self._usage_cache:
+            self._usage_cache[key] = disk_usage(self.dst_dir, entry)
+        return self._usage_cache[key]
+
+    def prune(self):
+        with self.fs_lock:
+            entries = catalog.sorted_entries(self.get_catalog(), self.owns)
+            protected = {os.path.basename(p) for p in self.get_protected()}
+        # 统计磁盘占用要遍历文件夹快照，不持有锁；删除前会在锁内再确认槽位
+        current = {(e['path'], e['timestamp']) for e in entries}
+        self._usage_cache = {key: units for key, units in self._usage_cache.items() if key in current}
+        to_delete = plan(entries, self.policy, protected, usage=self.usage)
+        if not to_delete:
+            return
+
+        reclaimed_bytes = 0
+        removed = 0
+        removed_store_snapshot = False
+        for entry in to_delete:
+            with self.fs_lock:
+                # 等待期间槽位可能已变化，删除前再确认一次
+                if entry['path'] in {os.path.basename(p) for p in self.get_protected()}:
+                    continue
+                if self.on_delete is not None:
+                    self.on_delete(os.path.join(self.dst_dir, entry['path']))
+                entry_freed = freed_bytes(self.dst_dir, entry)
+                try:
+                    delete_snapshot(self.dst_dir, entry)
+                except FileNotFoundError:
+                    pass
+                catalog.remove(self.dst_dir, self.get_catalog(), entry['path'])
+            removed += 1
+            self._usage_cache.pop((entry['path'], entry['timestamp']), None)
+            if entry['kind'] == 'store':
+                removed_store_snapshot = True
+            else:
+                reclaimed_bytes += entry_freed
+            print(f"Pruned old backup {entry['name']}.")
+
+        if removed_store_snapshot:
+            with self.gc_lock:
+                if self.on_delete is not None:
+                    self.on_delete(os.path.join(self.dst_dir, store.OBJECTS_DIRNAME))
+                removed_objects, removed_object_bytes = store.collect_garbage(self.dst_dir)
+            reclaimed_bytes += removed_object_bytes
+            print(f"Removed {removed_objects} unreferenced objects from the object store.")
+        print(f"Retention pruned {removed} backups and reclaimed {reclaimed_bytes} bytes.")
@@ -0,0 +1,621 @@
+"""存档管理核心：快照、列出、浏览、恢复、校验和清理，不依赖键盘钩子，可被热键程序、命令行和基准测试共用
+
+本模块只导入标准库和项目内模块；psutil 只在恢复前检查游戏进程时才导入，进度显示由前端通过 progress.Progress 提供。
+"""
+import os
+import sys
+import json
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import archive
+import browse
+import catalog
+import copyengine
+import diffrestore
+import integrity
+import oplog
+import prestage
+import restorecache
+import retention
+import store
+import swap
+from progress import Progress
+
+
+class ConfigError(Exception):
+    """配置文件缺失、无法解析或缺少必填项"""
+
+
+class RestoreAborted(Exception):
+    """恢复前的检查未通过（游戏正在运行或备份校验失败），存档未被改动"""
+
+
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+
+def load_config(config_file_path=None):
+    """读取 config.json，出错时抛出 ConfigError 而不是直接退出，由调用方决定如何处理"""
+    if config_file_path is None:
+        config_file_path = resource_path('config.json')
+    try:
+        with open(config_file_path, 'r', encoding='utf-8') as config_file:
+            return json.load(config_file)
+    except FileNotFoundError:
+        raise ConfigError(f"Config file not found at {config_file_path}")
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"Failed to parse config file: {e}")
+
+
+def print_copy_errors(error):
+    """逐个打印并行复制中汇总的文件错误"""
+    failures = error.args[0] if error.args else None
+    if not isinstance(failures, list):
+        print(f"Copy failed: {error}")
+        return
+    print(f"{len(failures)} file(s) failed to copy:")
+    for src, dst, why in failures:
+        print(f"  {src} -> {dst}: {why}")
+
+
+def shorten_path(path_str):
+    """缩短路径，移除直到 LocalLow 的部分并用 ... 替换"""
+    local_low_index = path_str.find(r'LocalLow')
+    if local_low_index != -1:
+        return '...' + path_str[local_low_index + len('LocalLow'):]
+    else:
+        return path_str
+
+
+def adjust_restore_path(backup_path, foldername='save00'):
+    """调整恢复路径以指向与存档同名的文件夹（例如 'save00'，如果存在）"""
+    save00_path = os.path.join(backup_path, foldername)
+    if os.path.isdir(save00_path):
+        print(f"'{foldername}' folder found within the backup. Adjusting restore path to: {save00_path}")
+        return save00_path
+    else:
+        print(" Using original backup path.")
+        return backup_path
+
+
+class SharedBackupDir:
+    """多个存档配置共用的备份目录：目录表、对象库、操作日志、恢复缓存和后端同步都只有一份"""
+
+    def __init__(self, dst_dir, restore_cache=None, backends=(), sync_workers=copyengine.DEFAULT_WORKERS):
+        self.dst_dir = dst_dir
+        self.catalog = None
+        self.managers = []
+        self.oplog = oplog.OperationLog(dst_dir)
+        self.restore_cache = restore_cache
+        # 快照完成后在后台把备份目录同步到 config.json 中 backends 列出的镜像目录或对象存储，没有后端时为 None
+        self.replicator = None
+        if backends:
+            import replicate
+            self.replicator = replicate.Replicator(dst_dir, list(backends), lambda: self.catalog, self.oplog,
+                                                   workers=sync_workers)
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        # 热键程序中各配置在自己的后台线程里同时加载，目录表只读取一次
+        with self._load_lock:
+            self._load()
+
+    def _load(self):
+        if self.catalog is not None:
+            return
+        if not os.path.exists(self.dst_dir):
+            os.makedirs(self.dst_dir)
+            print(f"Backup directory created at {self.dst_dir}")
+        # 目录表缺失或备份目录在外部被改动过时才重新扫描
+        self.catalog = catalog.load_or_rebuild(self.dst_dir)
+
+    def __enter__(self):
+        """按固定顺序获取所有配置的锁，对象库垃圾回收期间任何配置都不能写入快照"""
+        for manager in self.managers:
+            manager.lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for manager in reversed(self.managers):
+            manager.lock.release()
+        return False
+
+
+def load_profiles(config):
+    """按配置创建每个存档配置的 SaveManager，它们共用同一个备份目录。
+
+    顶层的 src_path 是默认配置（名称为文件夹名，例如 save00）；profiles 中的每一项是另一个存档文件夹，
+    未写出的设置沿用顶层的值，但热键只有默认配置会沿用，避免两个配置抢同一个热键
+    """
+    base = {key: value for key, value in config.items() if key != 'profiles'}
+    profiles = []
+    if base.get('src_path'):
+        profiles.append((None, base))
+    for name, profile in (config.get('profiles') or {}).items():
+        if not name or name.startswith('.') or any(c in name for c in '/\\'):
+            raise ConfigError(f"Invalid profile name: {name!r}")
+        merged = {key: value for key, value in base.items() if key not in ('copy_hotkey', 'restore_hotkey')}
+        merged.update(profile)
+        profiles.append((name, merged))
+    if not profiles:
+        raise ConfigError("Source path or destination directory is not specified in the config file.")
+
+    shared = None
+    managers = []
+    for name, profile_config in profiles:
+        manager = SaveManager(profile_config, name, shared)
+        shared = manager.shared
+        managers.append(manager)
+    names = [m.name for m in managers]
+    if len(set(names)) != len(names):
+        raise ConfigError(f"Duplicate profile names: {', '.join(names)}")
+    return managers
+
+
+def find_profile(managers, name):
+    """按名称查找存档配置，name 为 None 时返回默认（第一个）配置"""
+    if name is None:
+        return managers[0]
+    for manager in managers:
+        if manager.name == name:
+            return manager
+    raise ConfigError(f"Unknown profile {name!r}, available: {', '.join(m.name for m in managers)}")
+
+
+class SaveManager:
+    """按配置管理一个存档文件夹（存档配置）及其在备份目录中的快照。
+
+    快照和恢复在执行期间持有 lock，后台清理每删除一个快照也会获取它，三者不会同时进行。
+    不同的存档配置各有自己的锁和 1-9 号槽位，可以同时快照；共用的目录表和对象库由 shared 协调。
+    """
+
+    def __init__(self, config, name=None, shared=None):
+        self.config = config
+        # 使用 os.path.expandvars 扩展环境变量
+        self.src_path = os.path.expandvars(config.get('src_path', ''))
+        self.dst_dir = os.path.expandvars(config.get('dst_dir', ''))
+        if not self.src_path or not self.dst_dir:
+            raise ConfigError("Source path or destination directory is not specified in the config file.")
+        # 配置名也是快照名的前缀（save00_20240101_120000），默认为存档文件夹名
+        self.name = name or os.path.basename(os.path.normpath(self.src_path))
+        if shared is None:
+            # 恢复缓存的内存上限对整个进程生效，由默认配置决定
+            restore_cache = None
+            if config.get('restore_cache_bytes'):
+                restore_cache = restorecache.RestoreCache(
+                    config['restore_cache_bytes'],
+                    config.get('restore_cache_mmap_bytes', restorecache.DEFAULT_MMAP_BYTES))
+            storage_backends = []
+            if config.get('backends'):
+                # 只有配置了后端时才导入，http.client、ssl 和 xml 不会拖慢热键程序和命令行的启动
+                import backends
+                try:
+                    storage_backends = [backends.make_backend(backend) for backend in config['backends']]
+                except ValueError as e:
+                    raise ConfigError(str(e))
+            shared = SharedBackupDir(self.dst_dir, restore_cache, storage_backends,
+                                     int(config.get('sync_workers', copyengine.DEFAULT_WORKERS)))
+        elif os.path.normcase(os.path.abspath(shared.dst_dir)) != os.path.normcase(os.path.abspath(self.dst_dir)):
+            raise ConfigError(f"Profile {self.name} must use the shared backup directory {shared.dst_dir}")
+        self.shared = shared
+        shared.managers.append(self)
+        self.copy_hotkey = config.get('copy_hotkey')
+        self.restore_hotkey = config.get('restore_hotkey')
+        self.noita_path = os.path.expandvars(config.get('noita_path', 'D:\\steam\\steamapps\\common\\Noita\\noita.exe'))
+        # 快照方式：folder 为整个文件夹复制，store 为内容寻址的去重对象库，archive 为单个压缩文件
+        self.snapshot_mode = config.get('snapshot_mode', 'folder').lower()
+        # archive 模式的压缩编码（auto/zstd/gz/xz）与级别，级别留空时使用偏向速度的默认值
+        self.archive_codec = config.get('archive_codec', 'auto')
+        self.archive_level = config.get('archive_level')
+        # store 模式下不小于这个字节数的文件按内容分块保存，只存改动过的块；0 或 null 表示不分块
+        self.chunk_threshold = config.get('chunk_threshold', store.DEFAULT_CHUNK_THRESHOLD)
+        # 复制期间存档被改写时，最多重新复制改动文件的轮数
+        self.consistency_retries = int(config.get('consistency_retries', 3))
+        # 恢复方式：full 为在暂存目录完整还原后整体替换，diff 为只改写与备份不同的文件
+        self.restore_mode = config.get('restore_mode', 'full').lower()
+        # diff 模式下对大小和修改时间都相同的文件再比对摘要
+        self.restore_check_hash = config.get('restore_check_hash', False)
+        # 恢复前按快照清单校验备份是否完整
+        self.verify_before_restore = config.get('verify_before_restore', True)
+        # 保留策略：keep_last / keep_hourly / keep_daily / max_total_bytes，全部为空时不删除任何备份
+        self.retention_policy = config.get('retention') or {}
+        # 并行复制文件的线程数
+        self.copy_workers = int(config.get('copy_workers', copyengine.DEFAULT_WORKERS))
+
+        # 本配置 1-9 号槽位对应的最近备份，清理时永远不会删除
+        self.recent_backups = []
+        self.lock = threading.Lock()
+        self.pruner = retention.Pruner(self.dst_dir, self.retention_policy, self.lock,
+                                       get_catalog=lambda: self.catalog,
+                                       get_protected=lambda: list(self.recent_backups),
+                                       owns=self.owns, gc_lock=shared,
+                                       on_delete=shared.restore_cache.invalidate if shared.restore_cache else None)
+        # 空闲时在存档旁边预先准备好最近 prestage_slots 个槽位（最多 2 个）的副本，恢复时直接改名替换
+        self.prestager = prestage.Prestager(
+            self.src_path, config.get('prestage_slots', 0), self.lock,
+            get_recent=lambda: list(self.recent_backups), content_path=self._content_path,
+            verify=self.verify if self.verify_before_restore else None,
+            max_bytes=config.get('prestage_max_bytes'), workers=self.copy_workers)
+        # 每次备份和恢复各阶段的耗时记录在备份目录的 .meta/operations.jsonl 中
+        self.oplog = shared.oplog
+        # 返回游戏是否正在运行；热键程序换成后台缓存 PID 的 ProcessWatcher，命令行只在恢复时扫描一次
+        self.is_game_running = self._scan_for_game
+
+    @property
+    def catalog(self):
+        """备份目录的持久化目录表，load() 时读取，每次备份后增量更新，所有配置共用"""
+        return self.shared.catalog
+
+    def owns(self, source):
+        """快照名前缀为 source 的快照是否属于本配置；没有时间戳或不属于任何配置的快照归默认配置"""
+        if source == self.name:
+            return True
+        if self is not self.shared.managers[0]:
+            return False
+        return source not in {m.name for m in self.shared.managers}
+
+    def operation(self, op, **fields):
+        """创建一条操作记录，例如 operation('backup', trigger='hotkey')，传给 snapshot() 或 restore()"""
+        return self.oplog.operation(op, profile=self.name, **fields)
+
+    def _scan_for_game(self):
+        import procwatch
+        return procwatch.ProcessWatcher(self.noita_path).scan()
+
+    def recover_swap(self):
+        """上次恢复若在两次改名之间中断，把存档放回原处。
+
+        只在快照、恢复和热键程序启动时调用，list、files、diff 等只读命令不会移动存档文件夹
+        """
+        swap.recover(self.src_path)
+
+    def load(self):
+        """确保备份文件夹存在并加载现有存档"""
+        self.shared.load()
+        self.recent_backups = catalog.recent_paths(self.dst_dir, self.catalog, owns=self.owns)
+        if len(self.shared.managers) > 1:
+            print(f"Loaded {len(self.recent_backups)} existing backups for {self.name}.")
+        else:
+            print(f"Loaded {len(self.recent_backups)} existing backups.")
+
+    def list(self):
+        """按时间从新到旧返回本配置全部快照的目录记录，第 N 条即 restore(N) 恢复的备份"""
+        return catalog.sorted_entries(self.catalog, self.owns)
+
+    def backup_path(self, index):
+        entries = self.list()
+        if index < 1 or index > len(entries):
+            raise IndexError(f"Invalid backup index: {index}. Available backups are from 1 to {len(entries)}.")
+        return os.path.join(self.dst_dir, entries[index - 1]['path'])
+
+    def snapshot(self, name=None, op=None):
+        """对存档做一次快照，返回 (快照路径, 是否一致)；复制失败时抛出异常。
+
+        name 默认为 配置名_时间戳，同一秒内多次快照（例如基准测试）时需要另行指定；
+        op 为 operation() 创建的操作记录，不传时新建一条
+        """
+        if op is None:
+            op = self.operation('backup')
+        # 等待锁的时间计入 queue 阶段
+        with self.lock, op:
+            self.recover_swap()
+            return self._snapshot(self.src_path, self.dst_dir, name, op)
+
+    def _snapshot(self, src, dst_dir, name, op):
+        with op.span('check'):
+            print(f"Checking source path: {src}")
+            if not os.path.exists(src) or not os.access(src, os.R_OK):
+                raise PermissionError(f"No read access to {src}")
+
+            print(f"Checking destination directory: {dst_dir}")
+            if not os.path.isdir(dst_dir) or not os.access(dst_dir, os.W_OK):
+                raise PermissionError(f"No write access to {dst_dir}")
+
+        # 增量索引按配置区分，名称与快照名前缀相同
+        foldername = self.name
+        if name is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            name = f'{foldername}_{timestamp}'
+        dst = os.path.join(dst_dir, name)
+
+        # 上一次快照的 (size, mtime_ns, hash) 索引，未变化的文件不再复制
+        with op.span('load_index'):
+            index = store.load_index(dst_dir, foldername)
+        if self.snapshot_mode == 'store':
+            print(f"Storing snapshot of {src} into {dst_dir}")
+            with op.span('copy') as phase:
+                dst, files, new_files, new_bytes, consistent = store.snapshot_to_store(
+                    src, dst_dir, name, index, workers=self.copy_workers, retries=self.consistency_retries,
+                    chunk_threshold=self.chunk_threshold)
+                phase.update(files=new_files, bytes=new_bytes)
+            print(f"Snapshot saved to {dst} ({new_files} new files, {new_bytes} bytes stored)")
+        elif self.snapshot_mode == 'archive':
+            print(f"Archiving {src} into {dst_dir}")
+            with op.span('copy') as phase:
+                dst, files = archive.write_archive(src, dst_dir, name, self.archive_codec, self.archive_level)
+                phase.update(files=len(files), bytes=os.path.getsize(dst))
+            print(f"Snapshot archive saved to {dst} ({os.path.getsize(dst)} bytes)")
+            # 压缩流写完后无法再替换单个文件，只检查并记录是否一致
+            with op.span('consistency'):
+                changed, removed = store.changed_files(src, files)
+                consistent = not changed and not removed
+            with op.span('manifest'):
+                store.write_sidecar_manifest(dst_dir, 'archive', name, src, files, consistent, store.list_dirs(src))
+        else:
+            if os.path.exists(dst):
+                raise FileExistsError(dst)
+            print(f"Copying folder from {src} to {dst}")
+            # 先复制到以 . 开头的临时目录，完成后再改名，中途失败不会留下看似完整的备份
+            partial_dst = os.path.join(dst_dir, f'.partial_{name}')
+            shutil.rmtree(partial_dst, ignore_errors=True)
+            try:
+                with op.span('copy') as phase:
+                    files, copied_files, copied_bytes, linked_files, consistent = store.incremental_copytree(
+                        src, partial_dst, index, workers=self.copy_workers, retries=self.consistency_retries)
+                    phase.update(files=copied_files, bytes=copied_bytes)
+                os.rename(partial_dst, dst)
+            except BaseException:
+                # 临时目录以 . 开头，目录表和清理都不会看到它，失败时必须在这里删除
+                shutil.rmtree(partial_dst, ignore_errors=True)
+                raise
+            with op.span('manifest'):
+                store.write_sidecar_manifest(dst_dir, 'folder', name, src, files, consistent, store.list_dirs(dst))
+            print(f"Folder copied successfully to {dst} "
+                  f"({copied_files} files / {copied_bytes} bytes copied, {linked_files} unchanged files linked)")
+        with op.span('index'):
+            store.save_index(dst_dir, foldername, dst, files)
+        with op.span('catalog'):
+            catalog.add(dst_dir, self.catalog, dst, files, 'ok' if consistent else 'inconsistent')
+        op.fields.update(snapshot=name, mode=self.snapshot_mode, files=len(files),
+                         bytes=sum(f['size'] for f in files.values()), consistent=consistent)
+        if not consistent:
+            print("Warning: The save kept changing during the copy, this backup may mix files from different saves.")
+        # 更新最近的备份路径，并保持最多9个备份
+        self.recent_backups = catalog.recent_paths(dst_dir, self.catalog, owns=self.owns)
+        return dst, consistent
+
+    def verify(self, backup_path, read_function=None):
+        """按清单校验备份，损坏时在目录表中标记并返回 False；没有清单的旧备份直接放行。
+
+        read_function 见 integrity.verify_snapshot，恢复时传入恢复缓存的读取函数
+        """
+        problems = integrity.verify_snapshot(backup_path, self.copy_workers, read_function)
+        if problems is None:
+            print(f"No manifest for {shorten_path(backup_path)}, skipping verification.")
+            return True
+        if problems:
+            print(f"Backup {shorten_path(backup_path)} failed verification ({len(problems)} problems):")
+            for problem in problems[:10]:
+                print(f"  {problem}")
+            catalog.set_status(self.dst_dir, self.catalog, backup_path, 'corrupt')
+            return False
+        print(f"Backup {shorten_path(backup_path)} verified.")
+        return True
+
+    def restore(self, index, progress=None, op=None):
+        """将指定编号的备份恢复到存档文件夹。
+
+        progress 为 progress.Progress 的实例，按字节报告写入进度，不传时不显示；
+        检查未通过时抛出 RestoreAborted，复制失败时抛出异常，两种情况下现有存档都不受影响（diff 模式除外）
+        """
+        if progress is None:
+            progress = Progress()
+        if op is None:
+            op = self.operation('restore')
+        with self.lock, op:
+            self.recover_swap()
+            src_backup = self.backup_path(index)
+            op.fields.update(slot=index, snapshot=os.path.basename(src_backup), mode=self.restore_mode)
+            self._restore(src_backup, progress, op)
+
+    def _content_path(self, backup_path):
+        """快照中实际存放存档内容的位置；旧版本的文件夹快照可能把存档文件夹整个嵌套在里面"""
+        if store.is_manifest(backup_path) or archive.is_archive(backup_path):
+            return backup_path
+        return adjust_restore_path(backup_path, os.path.basename(os.path.normpath(self.src_path)))
+
+    def _restore(self, src_backup, progress, op):
+        adjusted_src_backup = self._content_path(src_backup)
+
+        # 检查 Noita 文件是否被占用
+        with op.span('game_check'):
+            game_running = self.is_game_running()
+        if game_running:
+            raise RestoreAborted("Some files in the Noita directory appear to be in use. Aborting restore.")
+
+        # 预暂存的副本在准备时已经校验过，只需改名替换
+        start = time.perf_counter()
+        if self.prestager.take(src_backup, self.src_path):
+            op.record('swap', time.perf_counter() - start)
+            op.fields.update(staged=True)
+            print(f"Backup restored successfully to {shorten_path(self.src_path)} from the pre-staged copy.")
+            return
+
+        # 开启恢复缓存时文件内容经由内存复制，反复恢复同一快照时校验和复制都不再读取备份；压缩快照只能流式解压，不经过缓存
+        cache = self.shared.restore_cache if not archive.is_archive(adjusted_src_backup) else None
+        cache_before = cache.stats() if cache is not None else None
+
+        if self.verify_before_restore:
+            with op.span('verify'):
+                verified = self.verify(src_backup, cache.read if cache is not None else None)
+            if not verified:
+                raise RestoreAborted(f"Backup {shorten_path(src_backup)} is corrupt. Aborting restore.")
+
+        if self.restore_mode == 'diff':
+            self._restore_diff(src_backup, adjusted_src_backup, self.src_path, progress, op)
+            return
+
+        parent_dir = str(Path(self.src_path).parent)
+        foldername = os.path.basename(os.path.normpath(self.src_path))
+        dst_path = os.path.join(parent_dir, foldername)
+        # 先在同级暂存目录中完整还原，成功后再用改名替换，失败时现有存档不受影响
+        with op.span('prepare_staging'):
+            staging_path = swap.prepare_staging(dst_path)
+        progress_lock = threading.Lock()
+        progress_closed = False
+        copied = [0, 0]
+        copy_file = cache.copy if cache is not None else copyengine.fast_copy
+
+        def on_file(size):
+            # 复制在线程池中并行进行，更新进度时需要加锁
+            with progress_lock:
+                copied[0] += 1
+                copied[1] += size
+                progress.update(1, size)
+
+        try:
+            print(f"Restoring from {shorten_path(adjusted_src_backup)} to {shorten_path(dst_path)}")
+
+            if store.is_manifest(adjusted_src_backup):
+                # 对象库快照：文件列表和总字节数直接取自清单
+                with op.span('count'):
+                    manifest = store.load_manifest(adjusted_src_backup)
+                progress.start(len(manifest['files']), sum(f['size'] for f in manifest['files'].values()))
+                with op.span('copy') as phase:
+                    store.restore_from_manifest(adjusted_src_backup, staging_path, copy_function=copy_file,
+                                                workers=self.copy_workers, manifest=manifest, on_file=on_file,
+                                                read_function=cache.read if cache is not None else None)
+            elif archive.is_archive(adjusted_src_backup):
+                # 压缩快照：边读边解压写入，总数取自旁路清单，旧快照没有清单时未知
+                with op.span('count'):
+                    manifest_path = integrity.manifest_for(adjusted_src_backup)
+                    files = store.load_manifest(manifest_path)['files'] if manifest_path is not None else None
+                if files is not None:
+                    progress.start(len(files), sum(f['size'] for f in files.values()))
+                else:
+                    progress.start(None, None)
+                with op.span('copy') as phase:
+                    archive.extract_archive(adjusted_src_backup, staging_path,
+                                            on_file=lambda member: on_file(member.size))
+            else:
+                # 文件夹快照：一次 scandir 遍历同时得到文件列表和总字节数，复制时直接使用这份列表
+                with op.span('count'):
+                    tree = copyengine.scan_tree(adjusted_src_backup, staging_path)
+                sizes = {src_file: size for src_file, _, size in tree[0]}
+                progress.start(len(sizes), sum(sizes.values()))
+
+                def copy_with_progress(src, dst):
+                    """带进度的文件复制函数"""
+                    try:
+                        copy_file(src, dst)
+                        on_file(sizes[src])
+                    except Exception as e:
+                        print(f"Failed to copy {src}: {e}")
+                        raise
+
+                with op.span('copy') as phase:
+                    copyengine.copytree(adjusted_src_backup, staging_path, self.copy_workers,
+                                        copy_function=copy_with_progress, tree=tree)
+            phase.update(files=copied[0], bytes=copied[1])
+            progress.close()
+            progress_closed = True
+            if cache is not None:
+                self._record_cache_stats(cache_before, cache.stats(), op)
+
+            with op.span('swap'):
+                swap.swap_in(staging_path, dst_path)
+            print(f"Backup restored successfully to {shorten_path(dst_path)}")
+        except Exception:
+            if not progress_closed:
+                progress.close()
+            print(f"Restore aborted, {shorten_path(dst_path)} was left unchanged.")
+            raise
+        finally:
+            with op.span('cleanup'):
+                shutil.rmtree(staging_path, ignore_errors=True)
+
+    def _record_cache_stats(self, before, after, op):
+        """把本次恢复的缓存命中和淘汰情况写入操作记录"""
+        delta = {key: after[key] - before[key] for key in ('hits', 'misses', 'hit_bytes', 'evictions', 'evicted_bytes')}
+        op.fields.update(cache=dict(delta, bytes=after['bytes'], max_bytes=after['max_bytes']))
+        print(f"Restore cache: {delta['hits']} hits ({delta['hit_bytes']} bytes), {delta['misses']} misses, "
+              f"{delta['evictions']} evicted; holding {after['bytes']} of {after['max_bytes']} bytes")
+
+    def _restore_diff(self, backup_path, content_path, dst_path, progress, op):
+        """差异恢复：只改写与备份不同的文件并删除多余文件，进度按实际写入的字节计"""
+        progress_lock = threading.Lock()
+        start = time.perf_counter()
+        planned = None
+
+        def on_plan(total_bytes, total_files):
+            nonlocal planned
+            planned = time.perf_counter()
+            op.record('plan', planned - start, total_files, total_bytes)
+            progress.start(total_files, total_bytes)
+            if total_files is not None:
+                print(f"{total_files} files differ from the backup.")
+
+        def on_file(size):
+            with progress_lock:
+                progress.update(1, size)
+
+        print(f"Restoring changed files from {shorten_path(backup_path)} to {shorten_path(dst_path)}")
+        try:
+            written_files, written_bytes, deleted_files, unchanged_files = diffrestore.diff_restore(
+                backup_path, content_path, dst_path, self.restore_check_hash, self.copy_workers,
+                on_plan=on_plan, on_file=on_file)
+        finally:
+            progress.close()
+        # 写入改动的文件、删除多余文件和目录都计入 write 阶段
+        op.record('write', time.perf_counter() - (planned or start), written_files, written_bytes)
+        print(f"Backup restored successfully to {shorten_path(dst_path)} ({written_files} files / {written_bytes} bytes "
+              f"written, {deleted_files} removed, {unchanged_files} unchanged)")
+
+    def contents(self, index):
+        """返回第 index 个备份中的文件 {相对路径: {'size', 'mtime_ns', 'hash'}}，直接读取清单，不遍历快照"""
+        backup_path = self.backup_path(index)
+        return browse.snapshot_files(backup_path, self._content_path(backup_path))
+
+    def extract(self, index, patterns, dst=None, op=None):
+        """只从第 index 个备份中取回与 patterns（相对路径或 glob）匹配的文件，返回取回的相对路径列表。
+
+        dst 默认为存档文件夹，此时与恢复一样要求游戏未运行；指定其他目录时不检查。
+        其余文件保持不动，没有匹配的文件时抛出 FileNotFoundError
+        """
+        if op is None:
+            op = self.operation('extract')
+        with self.lock, op:
+            backup_path = self.backup_path(index)
+            content_path = self._content_path(backup_path)
+            target = dst if dst is not None else self.src_path
+            op.fields.update(slot=index, snapshot=os.path.basename(backup_path))
+            with op.span('count') as phase:
+                files = browse.snapshot_files(backup_path, content_path)
+                selected = browse.select(files, patterns)
+                phase.update(files=len(selected), bytes=sum(files[rel_file]['size'] for rel_file in selected))
+            if not selected:
+                raise FileNotFoundError(f"No files in {shorten_path(backup_path)} match {', '.join(patterns)}")
+            if dst is None:
+                self.recover_swap()
+                with op.span('game_check'):
+                    game_running = self.is_game_running()
+                if game_running:
+                    raise RestoreAborted("Some files in the Noita directory appear to be in use. Aborting extract.")
+            with op.span('copy') as phase:
+                written_bytes = browse.extract(backup_path, content_path, files, selected, target,
+                                               on_file=lambda rel_file: print(f"Extracted {rel_file}"))
+                phase.update(files=len(selected), bytes=written_bytes)
+            print(f"Extracted {len(selected)} files ({written_bytes} bytes) from {shorten_path(backup_path)} "
+                  f"to {shorten_path(target)}")
+            return selected
+
+    def diff(self, old_index, new_index):
+        """按清单中的摘要比较两个备份，返回 (新增, 删除, 修改) 的相对路径列表，不读取文件内容"""
+        return browse.diff(self.contents(old_index), self.contents(new_index))
+
+    def prune(self):
+        """立即按保留策略清理一次，热键程序改为在每次备份后通过 pruner.request() 在后台进行"""
+        if not retention.is_enabled(self.retention_policy):
+            print("No retention policy configured, nothing to prune.")
+            return
+        self.pruner.prune()
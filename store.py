@@ -0,0 +1,566 @@
+"""内容寻址的备份存储：相同内容的文件只保存一次，每个快照只是一份指向对象的清单
+
+大文件（不小于 chunk_threshold）按内容切分成块，每块是一个对象，清单中记录各块的摘要和大小。
+游戏每次整体重写这些文件但只改动其中几处，切分点由内容决定，改动前后相同的块只保存一次。
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+
+import copyengine
+
+# 对象库目录，以 . 开头以免被当作备份文件夹列出
+OBJECTS_DIRNAME = '.objects'
+MANIFEST_SUFFIX = '.manifest.json'
+# 索引、目录等元数据放在子目录中，写入它们不会改变备份目录本身的修改时间
+META_DIRNAME = '.meta'
+# 记录上一次快照中每个文件 (size, mtime_ns, hash) 的索引，按源文件夹名区分
+INDEX_PREFIX = 'index_'
+INDEX_VERSION = 1
+MANIFESTS_DIRNAME = 'manifests'
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+TMP_SUFFIX = '.tmp'
+# 大于等于这个大小的文件按内容分块保存，0 或 None 表示不分块
+DEFAULT_CHUNK_THRESHOLD = 256 * 1024
+CHUNK_MIN_SIZE = 8 * 1024
+CHUNK_MAX_SIZE = 128 * 1024
+CHUNK_READ_SIZE = 4 * 1024 * 1024
+# 切分点由最近 len(CHUNK_PATTERN) 个字节决定：每个字节经 _CHUNK_BITS 映射为一位，
+# 这些位与 CHUNK_PATTERN 相同时在此切分，相当于每字节取一位的滚动哈希，平均每 2**15 字节出现一次。
+# 映射和查找都由 bytes.translate 与 bytes.find 在 C 中完成，比用 Python 逐字节计算 gear 哈希快几十倍。
+# 修改这两个值会改变切分位置，已保存的块仍然有效，只是不再与新快照去重
+CHUNK_PATTERN = b'011010011100101'
+_CHUNK_BITS = bytes(0x31 if hashlib.blake2b(bytes([b]), digest_size=1).digest()[0] & 1 else 0x30
+                    for b in range(256))
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，保证中途崩溃不会留下半个 JSON 文件"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def new_hasher():
+    """快照中所有文件摘要统一使用的算法"""
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_file(path):
+    """计算文件内容的 blake2b 摘要"""
+    h = new_hasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def object_path(dst_dir, digest):
+    """对象按摘要前两位分目录存放，避免单个目录下文件过多"""
+    return os.path.join(dst_dir, OBJECTS_DIRNAME, digest[:2], digest)
+
+
+def copy_and_hash(src, dst, metadata=True):
+    """复制文件的同时计算摘要，只读一遍源文件，metadata 为 True 时像 copy2 一样保留时间戳。
+
+    摘要总是按写入 dst 的内容计算，复制期间源文件被改写也不会得到与内容不符的摘要
+    """
+    if copyengine.strategy_for(src, dst) == 'reflink':
+        # 写时复制的文件系统上克隆几乎没有开销，只需再读一遍克隆出的文件计算摘要
+        copyengine.fast_copy(src, dst, metadata=metadata)
+        return hash_file(dst)
+    h = new_hasher()
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for chunk in iter(lambda: fsrc.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+            fdst.write(chunk)
+    if metadata:
+        shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def put_object(dst_dir, path):
+    """把文件复制进对象库并以摘要命名，返回 (摘要, 是否新写入)。
+
+    先边复制边计算摘要写入临时文件，再改名为对象；摘要和对象内容来自同一次读取，
+    复制期间游戏改写了文件也不会把新内容存到旧摘要下。对象已存在时丢弃临时文件
+    """
+    objects_dir = os.path.join(dst_dir, OBJECTS_DIRNAME)
+    os.makedirs(objects_dir, exist_ok=True)
+    tmp_path = os.path.join(objects_dir, f"{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}")
+    try:
+        digest = copy_and_hash(path, tmp_path, metadata=False)
+        obj = object_path(dst_dir, digest)
+        if os.path.exists(obj):
+            os.remove(tmp_path)
+            return digest, False
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        os.replace(tmp_path, obj)
+        return digest, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def put_object_data(dst_dir, data, digest):
+    """把内存中的数据以 digest 为名放入对象库，已存在时直接复用，返回是否新写入"""
+    obj = object_path(dst_dir, digest)
+    if os.path.exists(obj):
+        return False
+    os.makedirs(os.path.dirname(obj), exist_ok=True)
+    tmp_path = f"{obj}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, obj)
+    return True
+
+
+def iter_chunks(f, min_size=CHUNK_MIN_SIZE, max_size=CHUNK_MAX_SIZE):
+    """按内容切分文件对象 f，依次返回每一块的内容；除最后一块外每块在 min_size 与 max_size 之间"""
+    window = len(CHUNK_PATTERN)
+    buf = b''
+    bits = b''
+    pos = 0
+    eof = False
+    while True:
+        if not eof and len(buf) - pos < max_size:
+            data = f.read(CHUNK_READ_SIZE)
+            if data:
+                buf = buf[pos:] + data
+                bits = buf.translate(_CHUNK_BITS)
+                pos = 0
+                continue
+            eof = True
+        if pos >= len(buf):
+            return
+        end = min(pos + max_size, len(buf))
+        found = bits.find(CHUNK_PATTERN, pos + max(min_size - window, 0), end) if end - pos > min_size else -1
+        cut = found + window if found >= 0 else end
+        yield buf[pos:cut]
+        pos = cut
+
+
+def put_chunks(dst_dir, path):
+    """把文件按内容分块存入对象库，返回 (整个文件的摘要, [[块摘要, 块大小], ...], 新写入的字节数)"""
+    file_hasher = new_hasher()
+    chunks = []
+    written_bytes = 0
+    with open(path, 'rb') as f:
+        for data in iter_chunks(f):
+            file_hasher.update(data)
+            chunk_hasher = new_hasher()
+            chunk_hasher.update(data)
+            digest = chunk_hasher.hexdigest()
+            if put_object_data(dst_dir, data, digest):
+                written_bytes += len(data)
+            chunks.append([digest, len(data)])
+    return file_hasher.hexdigest(), chunks, written_bytes
+
+
+def entry_objects(entry):
+    """清单中一个文件的内容所在的对象：分块保存的文件为各块的摘要，否则为整个文件的摘要"""
+    if 'chunks' in entry:
+        return [digest for digest, _ in entry['chunks']]
+    return [entry['hash']]
+
+
+def entry_stored(dst_dir, entry):
+    return all(os.path.exists(object_path(dst_dir, digest)) for digest in entry_objects(entry))
+
+
+def copy_entry(dst_dir, entry, target, copy_function=copyengine.fast_copy, read_function=None):
+    """把清单中的一个文件从对象库写到 target，不设置修改时间。
+
+    整个保存的文件用 copy_function 复制对象；分块保存的文件依次写入各块，
+    read_function(对象路径) 返回块的内容（例如 RestoreCache.read），不传时直接流式读取对象
+    """
+    if 'chunks' not in entry:
+        copy_function(object_path(dst_dir, entry['hash']), target)
+        return
+    with open(target, 'wb') as fdst:
+        for digest, _ in entry['chunks']:
+            obj = object_path(dst_dir, digest)
+            if read_function is not None:
+                fdst.write(read_function(obj))
+                continue
+            with open(obj, 'rb') as fsrc:
+                shutil.copyfileobj(fsrc, fdst, HASH_CHUNK_SIZE)
+
+
+def is_manifest(path):
+    return str(path).endswith(MANIFEST_SUFFIX)
+
+
+def manifest_name(path):
+    """从清单文件路径取出快照名，例如 save00_20240101_120000"""
+    return os.path.basename(str(path))[:-len(MANIFEST_SUFFIX)]
+
+
+def relpath_key(path, start):
+    """清单里统一用 / 作为路径分隔符"""
+    return os.path.relpath(path, start).replace(os.sep, '/')
+
+
+def meta_path(dst_dir, *names):
+    return os.path.join(dst_dir, META_DIRNAME, *names)
+
+
+def index_path(dst_dir, foldername):
+    return meta_path(dst_dir, f'{INDEX_PREFIX}{foldername}.json')
+
+
+def load_index(dst_dir, foldername):
+    """读取上一次快照的索引，不存在或损坏时返回 None（退化为完整复制）"""
+    path = index_path(dst_dir, foldername)
+    try:
+        index = read_json(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable snapshot index {path}: {e}")
+        return None
+    if index.get('version') != INDEX_VERSION:
+        return None
+    return index
+
+
+def save_index(dst_dir, foldername, snapshot_path, files):
+    """快照完成后原子地更新索引，快照中途崩溃时旧索引保持不变"""
+    os.makedirs(meta_path(dst_dir), exist_ok=True)
+    write_json_atomic(index_path(dst_dir, foldername), {
+        'version': INDEX_VERSION,
+        'snapshot': os.path.basename(snapshot_path),
+        'files': files,
+    })
+
+
+def unchanged_entry(index, rel_file, st):
+    """如果文件的 size 和 mtime_ns 与索引一致，返回索引中的记录"""
+    if index is None:
+        return None
+    entry = index['files'].get(rel_file)
+    if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+        return entry
+    return None
+
+
+def scan_tree(src):
+    """只读取元数据，返回 {相对路径: (size, mtime_ns)}"""
+    stats = {}
+    for root, _, filenames in os.walk(src):
+        for file_name in filenames:
+            file_path = os.path.join(root, file_name)
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            stats[relpath_key(file_path, src)] = (st.st_size, st.st_mtime_ns)
+    return stats
+
+
+def list_dirs(root):
+    """返回 root 下全部子目录的相对路径，写入清单后空目录也能被恢复"""
+    dirs = []
+    for current, dirnames, _ in os.walk(root):
+        for dirname in dirnames:
+            dirs.append(relpath_key(os.path.join(current, dirname), root))
+    return dirs
+
+
+def parent_dirs(rel_files):
+    """返回各相对路径的全部上级目录"""
+    dirs = set()
+    for rel_file in rel_files:
+        parts = rel_file.split('/')[:-1]
+        for i in range(len(parts)):
+            dirs.add('/'.join(parts[:i + 1]))
+    return dirs
+
+
+def changed_files(src, files):
+    """对比快照记录的 (size, mtime_ns) 与 src 当前状态，返回 (新增或改动的文件, 已删除的文件)"""
+    current = scan_tree(src)
+    changed = [rel_file for rel_file, (size, mtime_ns) in current.items()
+               if rel_file not in files
+               or (files[rel_file]['size'], files[rel_file]['mtime_ns']) != (size, mtime_ns)]
+    removed = [rel_file for rel_file in files if rel_file not in current]
+    return changed, removed
+
+
+def make_consistent(src, files, recopy, remove, retries, workers=1):
+    """复制结束后重新检查 src，只重新复制在复制期间被游戏改写的文件，最多重试 retries 轮。
+
+    recopy(源文件, 相对路径) 返回新的文件记录，源文件已消失时返回 None；remove(相对路径) 删除快照中的文件。
+    返回快照是否与某一时刻的 src 一致
+    """
+    for attempt in range(retries + 1):
+        changed, removed = changed_files(src, files)
+        if not changed and not removed:
+            return True
+        if attempt == retries:
+            return False
+        print(f"Save changed while copying, re-copying {len(changed)} files (attempt {attempt + 1}/{retries}).")
+        for rel_file in removed:
+            remove(rel_file)
+            del files[rel_file]
+        tasks = [(os.path.join(src, *rel_file.split('/')), rel_file) for rel_file in changed]
+        for rel_file, entry in zip(changed, copyengine.run_parallel(recopy, tasks, workers)):
+            if entry is None:
+                files.pop(rel_file, None)
+            else:
+                files[rel_file] = entry
+    return False
+
+
+def incremental_copytree(src, dst, index=None, workers=1, retries=0):
+    """复制 src 到 dst，未变化的文件从上一次的文件夹快照硬链接过来，只有变化的文件才真正复制。
+
+    复制结束后按 make_consistent 检查并补复制期间被改写的文件。
+    返回 (文件索引, 复制的文件数, 复制的字节数, 硬链接的文件数, 是否一致)
+    """
+    previous_dst = None
+    if index is not None:
+        previous_dst = os.path.join(os.path.dirname(os.path.abspath(dst)), index['snapshot'])
+        if not os.path.isdir(previous_dst):
+            previous_dst = None
+
+    def copy_one(file_path, target, rel_file):
+        """源文件在遍历之后被游戏删除时返回 None，由 make_consistent 处理"""
+        try:
+            st = os.stat(file_path)
+            entry = unchanged_entry(index, rel_file, st) if previous_dst else None
+            if entry is not None:
+                try:
+                    os.link(os.path.join(previous_dst, *rel_file.split('/')), target)
+                    return entry, False
+                except OSError:
+                    # 文件系统不支持硬链接或旧文件已丢失，退回到普通复制
+                    pass
+            digest = copy_and_hash(file_path, target)
+        except FileNotFoundError:
+            if os.path.lexists(target):
+                os.remove(target)
+            return None
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest}, True
+
+    tasks = []
+    os.makedirs(dst)
+    for root, dirnames, filenames in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        for dirname in dirnames:
+            os.makedirs(os.path.join(target_root, dirname), exist_ok=True)
+        for file_name in filenames:
+            file_path = os.path.join(root, file_name)
+            tasks.append((file_path, os.path.join(target_root, file_name), relpath_key(file_path, src)))
+
+    files = {}
+    copied_files = 0
+    copied_bytes = 0
+    linked_files = 0
+    for (_, _, rel_file), result in zip(tasks, copyengine.run_parallel(copy_one, tasks, workers)):
+        if result is None:
+            continue
+        entry, copied = result
+        files[rel_file] = entry
+        if copied:
+            copied_files += 1
+            copied_bytes += entry['size']
+        else:
+            linked_files += 1
+
+    def recopy(file_path, rel_file):
+        target = os.path.join(dst, *rel_file.split('/'))
+        try:
+            st = os.stat(file_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # 目标可能是指向上一个快照的硬链接，必须先删除再写，不能原地覆盖
+            if os.path.lexists(target):
+                os.remove(target)
+            digest = copy_and_hash(file_path, target)
+        except FileNotFoundError:
+            return None
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest}
+
+    def remove(rel_file):
+        os.remove(os.path.join(dst, *rel_file.split('/')))
+
+    consistent = make_consistent(src, files, recopy, remove, retries, workers)
+    return files, copied_files, copied_bytes, linked_files, consistent
+
+
+def snapshot_to_store(src, dst_dir, name, index=None, workers=1, retries=0,
+                      chunk_threshold=DEFAULT_CHUNK_THRESHOLD):
+    """把 src 存入对象库并写出快照清单。
+
+    size 和 mtime_ns 与索引一致且对象仍在库中的文件直接引用原对象，不再读取；
+    不小于 chunk_threshold 的文件按内容分块保存，只写入库中还没有的块。
+    返回 (清单路径, 文件索引, 新写入的文件数, 新写入的字节数, 是否一致)
+    """
+    manifest_path = os.path.join(dst_dir, name + MANIFEST_SUFFIX)
+    if os.path.exists(manifest_path):
+        raise FileExistsError(manifest_path)
+
+    def store_one(file_path, rel_file, use_index=True):
+        """源文件在遍历之后被游戏删除时返回 None，由 make_consistent 处理"""
+        try:
+            return _store_one(file_path, rel_file, use_index)
+        except FileNotFoundError:
+            return None
+
+    def _store_one(file_path, rel_file, use_index):
+        st = os.stat(file_path)
+        entry = unchanged_entry(index, rel_file, st) if use_index else None
+        if entry is not None and entry_stored(dst_dir, entry):
+            return entry, 0, False
+        if chunk_threshold and st.st_size >= chunk_threshold:
+            digest, chunks, written_bytes = put_chunks(dst_dir, file_path)
+            entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest, 'chunks': chunks}
+            return entry, written_bytes, written_bytes > 0
+        digest, written = put_object(dst_dir, file_path)
+        entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest}
+        return entry, st.st_size if written else 0, written
+
+    def recopy(file_path, rel_file):
+        result = store_one(file_path, rel_file, use_index=False)
+        return result[0] if result is not None else None
+
+    dirs = []
+    tasks = []
+    for root, dirnames, filenames in os.walk(src):
+        for dirname in dirnames:
+            dirs.append(relpath_key(os.path.join(root, dirname), src))
+        for file_name in filenames:
+            file_path = os.path.join(root, file_name)
+            tasks.append((file_path, relpath_key(file_path, src)))
+
+    files = {}
+    new_files = 0
+    new_bytes = 0
+    results = copyengine.run_parallel(store_one, tasks, workers)
+    for (_, rel_file), result in zip(tasks, results):
+        if result is None:
+            continue
+        entry, written_bytes, written = result
+        files[rel_file] = entry
+        if written:
+            new_files += 1
+            new_bytes += written_bytes
+
+    # 对象库中的快照只是清单，删除文件只需从清单中去掉
+    consistent = make_consistent(src, files, recopy, lambda rel_file: None, retries, workers)
+    # 复制期间新建的目录不在最初遍历的结果中，补上重新复制的文件所在的目录
+    dirs = sorted(set(dirs) | parent_dirs(files))
+    write_json_atomic(manifest_path, make_manifest('store', name, src, files, dirs, consistent))
+    return manifest_path, files, new_files, new_bytes, consistent
+
+
+def make_manifest(kind, name, src, files, dirs=None, consistent=True):
+    """快照清单：每个文件的大小、修改时间和摘要，用于恢复、校验和浏览。
+
+    consistent 为 False 表示复制期间存档仍在被改写，快照中可能混有保存前后的文件
+    """
+    return {
+        'version': MANIFEST_VERSION,
+        'kind': kind,
+        'name': name,
+        'source': os.path.basename(os.path.normpath(src)),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'dirs': dirs or [],
+        'consistent': consistent,
+        'files': files,
+    }
+
+
+def sidecar_manifest_path(dst_dir, name):
+    """文件夹和压缩快照的清单放在 .meta/manifests 下，不会混进快照内容里"""
+    return meta_path(dst_dir, MANIFESTS_DIRNAME, name + '.json')
+
+
+def write_sidecar_manifest(dst_dir, kind, name, src, files, consistent=True, dirs=None):
+    """dirs 为快照中的目录（含空目录），差异恢复据此保留它们"""
+    os.makedirs(meta_path(dst_dir, MANIFESTS_DIRNAME), exist_ok=True)
+    path = sidecar_manifest_path(dst_dir, name)
+    write_json_atomic(path, make_manifest(kind, name, src, files, dirs, consistent))
+    return path
+
+
+def load_manifest(manifest_path):
+    manifest = read_json(manifest_path)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version in {manifest_path}: {manifest.get('version')}")
+    return manifest
+
+
+def restore_from_manifest(manifest_path, dst, copy_function=copyengine.fast_copy, workers=1, manifest=None,
+                          on_file=None, read_function=None):
+    """按清单把对象库中的文件还原成目录树 dst，copy_function 与 shutil.copytree 的同名参数用法一致。
+
+    分块保存的文件按 copy_entry 拼接，read_function 为读取块的函数。manifest 为已经读取的清单，on_file(字节数) 在每个文件写完后调用（可能来自多个线程）
+    """
+    if manifest is None:
+        manifest = load_manifest(manifest_path)
+    dst_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    os.makedirs(dst, exist_ok=True)
+    # 较早的清单可能缺少复制期间新建的目录，按文件路径补上
+    for rel_dir in sorted(set(manifest['dirs']) | parent_dirs(manifest['files'])):
+        os.makedirs(os.path.join(dst, *rel_dir.split('/')), exist_ok=True)
+
+    def restore_one(target, entry):
+        copy_entry(dst_dir, entry, target, copy_function, read_function)
+        # 对象文件被多个快照共用，其修改时间没有意义，这里恢复清单里记录的时间
+        os.utime(target, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        if on_file is not None:
+            on_file(entry['size'])
+
+    tasks = [(os.path.join(dst, *rel_file.split('/')), entry) for rel_file, entry in manifest['files'].items()]
+    copyengine.run_parallel(restore_one, tasks, workers)
+    return manifest
+
+
+def collect_garbage(dst_dir):
+    """删除不再被任何快照清单引用的对象，返回 (删除的对象数, 释放的字节数)。
+
+    调用方需保证期间没有正在写入的对象库快照，否则新快照刚引用的旧对象可能被误删
+    """
+    objects_dir = os.path.join(dst_dir, OBJECTS_DIRNAME)
+    if not os.path.isdir(objects_dir):
+        return 0, 0
+
+    referenced = set()
+    for entry_name in os.listdir(dst_dir):
+        if is_manifest(entry_name):
+            manifest = load_manifest(os.path.join(dst_dir, entry_name))
+            for entry in manifest['files'].values():
+                referenced.update(entry_objects(entry))
+
+    removed_objects = 0
+    removed_bytes = 0
+    for prefix in os.listdir(objects_dir):
+        prefix_dir = os.path.join(objects_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            # 中途崩溃的 put_object 留下的临时文件；回收期间没有正在写入的快照
+            if prefix.endswith(TMP_SUFFIX):
+                os.remove(prefix_dir)
+            continue
+        for digest in os.listdir(prefix_dir):
+            if digest in referenced:
+                continue
+            obj = os.path.join(prefix_dir, digest)
+            removed_bytes += os.path.getsize(obj)
+            os.remove(obj)
+            removed_objects += 1
+    return removed_objects, removed_bytes
@@ -0,0 +1,72 @@
+"""用同级暂存目录 + 目录改名替换存档文件夹，恢复失败时原存档保持不变"""
+import os
+import time
+import shutil
+
+RENAME_RETRIES = 5
+RENAME_RETRY_DELAY = 0.1
+
+
+def staging_path(dst):
+    """新存档先完整写到这里，与 dst 在同一个卷上，改名才是原子的"""
+    return os.path.normpath(dst) + '.restoring'
+
+
+def rollback_path(dst):
+    """替换期间旧存档暂存在这里，替换成功后才删除"""
+    return os.path.normpath(dst) + '.rollback'
+
+
+def _rename(src, dst):
+    # Windows 上杀毒软件或资源管理器可能短暂占用目录，稍等重试
+    for attempt in range(RENAME_RETRIES):
+        try:
+            os.rename(src, dst)
+            return
+        except PermissionError:
+            if attempt == RENAME_RETRIES - 1:
+                raise
+            time.sleep(RENAME_RETRY_DELAY)
+
+
+def prepare_staging(dst):
+    """清理上次遗留的暂存目录，返回本次使用的暂存路径"""
+    staging = staging_path(dst)
+    shutil.rmtree(staging, ignore_errors=True)
+    return staging
+
+
+def swap_in(staging, dst, keep_old=False):
+    """用两次改名把 staging 换成 dst；第二次改名失败时把旧存档改回原处。
+
+    keep_old 为 True 时不删除旧存档，返回它所在的路径（没有旧存档时返回 None），由调用方移走或删除
+    """
+    rollback = rollback_path(dst)
+    shutil.rmtree(rollback, ignore_errors=True)
+    had_old = os.path.exists(dst)
+    if had_old:
+        _rename(dst, rollback)
+    try:
+        _rename(staging, dst)
+    except BaseException:
+        if had_old:
+            _rename(rollback, dst)
+        raise
+    if not had_old:
+        return None
+    if keep_old:
+        return rollback
+    shutil.rmtree(rollback, ignore_errors=True)
+    return None
+
+
+def recover(dst):
+    """处理上次在两次改名之间中断的情况：存档不见了但回滚副本还在，就把它放回去"""
+    rollback = rollback_path(dst)
+    if not os.path.exists(dst) and os.path.isdir(rollback):
+        _rename(rollback, dst)
+        print(f"Recovered {dst} from an interrupted restore.")
+        return True
+    if os.path.exists(dst) and os.path.isdir(rollback):
+        shutil.rmtree(rollback, ignore_errors=True)
+    return False
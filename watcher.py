@@ -0,0 +1,256 @@
+"""自动快照：监视存档文件夹的变化，游戏一次保存的写入结束并安静一段时间后触发快照
+
+Linux 使用 inotify，Windows 使用 ReadDirectoryChangesW，其他情况退回到低频轮询。
+"""
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import threading
+import traceback
+
+DEFAULT_QUIET_SECONDS = 10.0
+DEFAULT_POLL_INTERVAL = 5.0
+# 空闲时每隔这么久醒来一次检查是否需要退出或重建监视
+IDLE_TIMEOUT = 1.0
+
+
+class PollingSource:
+    """后备方案：每隔 interval 秒比较一次整棵树的 (大小, 修改时间)"""
+
+    root_replaced = False
+
+    def __init__(self, root, interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._signature = self._scan()
+        self._last_scan = time.monotonic()
+
+    def _scan(self):
+        signature = {}
+        for root, _, filenames in os.walk(self.root):
+            for file_name in filenames:
+                file_path = os.path.join(root, file_name)
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                signature[file_path] = (st.st_size, st.st_mtime_ns)
+        return signature
+
+    def wait(self, timeout):
+        """两次扫描之间至少间隔 interval 秒，与 timeout 无关；调用方每秒醒来一次时不会每秒扫描一遍"""
+        deadline = time.monotonic() + timeout
+        while True:
+            next_scan = self._last_scan + self.interval
+            if next_scan > deadline:
+                time.sleep(max(0.0, deadline - time.monotonic()))
+                return False
+            time.sleep(max(0.0, next_scan - time.monotonic()))
+            signature = self._scan()
+            self._last_scan = time.monotonic()
+            if signature != self._signature:
+                self._signature = signature
+                return True
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """Linux inotify：内核推送事件，空闲时阻塞在 select 上，不占用 CPU"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, root):
+        self.root = root
+        self.root_replaced = False
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._watches = {}
+        self._root_wd = self._add_tree(root)
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+        if wd >= 0:
+            self._watches[wd] = path
+        return wd
+
+    def _add_tree(self, root):
+        """inotify 不会递归，需要给每个子目录单独添加监视"""
+        root_wd = self._add_watch(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for dirname in dirnames:
+                self._add_watch(os.path.join(dirpath, dirname))
+        return root_wd
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + self.EVENT_HEADER.size:offset + self.EVENT_HEADER.size + name_len].rstrip(b'\0')
+            offset += self.EVENT_HEADER.size + name_len
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO) and wd in self._watches:
+                self._add_tree(os.path.join(self._watches[wd], os.fsdecode(name)))
+            if wd == self._root_wd and mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                # 存档文件夹本身被改名或删除（例如恢复时的目录替换），需要重新监视新的文件夹
+                self.root_replaced = True
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+class WindowsSource:
+    """Windows ReadDirectoryChangesW：在独立线程中阻塞等待整棵树的变化"""
+
+    FILE_LIST_DIRECTORY = 0x0001
+    FILE_SHARE_ALL = 0x00000001 | 0x00000002 | 0x00000004  # READ | WRITE | DELETE，不妨碍恢复时改名
+    OPEN_EXISTING = 3
+    FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+    NOTIFY_FILTER = 0x00000001 | 0x00000002 | 0x00000008 | 0x00000010  # 文件名、目录名、大小、写入时间
+
+    def __init__(self, root):
+        from ctypes import wintypes
+        self.root = root
+        self.root_replaced = False
+        self._changed = threading.Event()
+        self._closed = False
+        self._kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self._kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                               wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+        self._kernel32.CreateFileW.restype = wintypes.HANDLE
+        self._kernel32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD,
+                                                         wintypes.BOOL, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD),
+                                                         wintypes.LPVOID, wintypes.LPVOID]
+        self._kernel32.ReadDirectoryChangesW.restype = wintypes.BOOL
+        self._kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, wintypes.LPVOID]
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._handle = self._kernel32.CreateFileW(root, self.FILE_LIST_DIRECTORY, self.FILE_SHARE_ALL, None,
+                                                  self.OPEN_EXISTING, self.FILE_FLAG_BACKUP_SEMANTICS, None)
+        if self._handle in (None, wintypes.HANDLE(-1).value):
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._thread = threading.Thread(target=self._run, name='save-watcher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        from ctypes import wintypes
+        buffer = ctypes.create_string_buffer(64 * 1024)
+        returned = wintypes.DWORD()
+        while not self._closed:
+            ok = self._kernel32.ReadDirectoryChangesW(self._handle, buffer, len(buffer), True, self.NOTIFY_FILTER,
+                                                      ctypes.byref(returned), None, None)
+            if not ok:
+                # 监视的文件夹被删除或句柄被关闭
+                self.root_replaced = not self._closed
+                self._changed.set()
+                return
+            self._changed.set()
+
+    def wait(self, timeout):
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+    def close(self):
+        self._closed = True
+        self._kernel32.CancelIoEx(self._handle, None)
+        self._kernel32.CloseHandle(self._handle)
+
+
+def make_source(root, poll_interval=DEFAULT_POLL_INTERVAL):
+    """按平台选择变化通知方式，失败时退回到轮询"""
+    try:
+        if sys.platform.startswith('linux'):
+            return InotifySource(root)
+        if sys.platform == 'win32':
+            return WindowsSource(root)
+    except (OSError, AttributeError) as e:
+        print(f"Warning: Native file watching unavailable ({e}), falling back to polling.")
+    return PollingSource(root, poll_interval)
+
+
+class AutoSnapshotter:
+    """监视 root，一批写入之后安静 quiet_seconds 秒再调用 on_quiet()"""
+
+    def __init__(self, root, on_quiet, quiet_seconds=DEFAULT_QUIET_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.on_quiet = on_quiet
+        self.quiet_seconds = quiet_seconds
+        self.poll_interval = poll_interval
+        self._generation = 0
+        self._reset = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='auto-snapshot', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def reset(self):
+        """丢弃尚未触发的变化并重建监视，恢复存档之后调用，避免把刚恢复的内容当成新的保存"""
+        self._generation += 1
+        self._reset.set()
+
+    def _run(self):
+        source = None
+        while not self._stop.is_set():
+            try:
+                if source is None or source.root_replaced or self._reset.is_set():
+                    if source is not None:
+                        source.close()
+                        source = None
+                    self._reset.clear()
+                    if not os.path.isdir(self.root):
+                        self._stop.wait(IDLE_TIMEOUT)
+                        continue
+                    source = make_source(self.root, self.poll_interval)
+                    continue
+
+                if not source.wait(IDLE_TIMEOUT):
+                    continue
+                generation = self._generation
+                # 游戏保存时会连续写入很多文件，等到一段时间内没有新的变化再快照
+                while not self._stop.is_set() and source.wait(self.quiet_seconds):
+                    pass
+                if self._stop.is_set() or generation != self._generation:
+                    continue
+                self.on_quiet()
+            except Exception as e:
+                print(f"An error occurred in the save folder watcher: {e}")
+                traceback.print_exc()
+                if source is not None:
+                    try:
+                        source.close()
+                    except OSError:
+                        pass
+                source = None
+                self._stop.wait(IDLE_TIMEOUT)
+        if source is not None:
+            source.close()